@@ -0,0 +1,14 @@
+from .sources import CATALOG_FILES, read_csv_tables, source_stats
+from .snapshot import SnapshotUnavailable, build_snapshot, load_snapshot, load_tables
+from .table import Table
+
+__all__ = [
+    "CATALOG_FILES",
+    "SnapshotUnavailable",
+    "Table",
+    "build_snapshot",
+    "load_snapshot",
+    "load_tables",
+    "read_csv_tables",
+    "source_stats",
+]
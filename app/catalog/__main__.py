@@ -0,0 +1,37 @@
+# python -m app.catalog build - compile the catalog CSVs into a binary snapshot
+
+import argparse
+import time
+from pathlib import Path
+
+from app.catalog.snapshot import build_snapshot, load_snapshot
+from app.core.catalog_snapshot import compile_catalog_arrays
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.catalog", description="Catalog snapshot tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="Compile data/*.csv into a memory-mappable snapshot")
+    build.add_argument("--data-path", default="data", help="Directory holding the catalog CSVs")
+    build.add_argument("--output", default=None, help="Snapshot directory (default: <data-path>/.catalog)")
+    args = parser.parse_args()
+
+    data_path = Path(args.data_path)
+    started = time.perf_counter()
+    snapshot_path = build_snapshot(data_path, Path(args.output) if args.output else None, compile_catalog_arrays)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    tables, arrays = load_snapshot(data_path, snapshot_path)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    size = sum(f.stat().st_size for f in snapshot_path.iterdir())
+    print(f"Built {snapshot_path} ({size / 1024:.1f} KiB) in {build_ms:.1f} ms; loads in {load_ms:.1f} ms")
+    for name, table in tables.items():
+        print(f"  {name}: {len(table)} rows, {len(table.columns)} columns")
+    for name, array in arrays.items():
+        print(f"  {name}: {array.dtype} {tuple(array.shape)}")
+
+
+if __name__ == "__main__":
+    main()
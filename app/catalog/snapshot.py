@@ -0,0 +1,230 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.catalog.sources import read_csv_tables, source_stats
+from app.catalog.table import NumericColumn, StringColumn, Table
+
+# Bump whenever the on-disk layout changes; older snapshots are then ignored
+FORMAT_VERSION = 5
+SNAPSHOT_DIRNAME = ".catalog"
+MANIFEST = "manifest.json"
+DATA_FILE = "catalog.bin"
+# Directory containing the app package, for running `python -m app.catalog`
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+class SnapshotUnavailable(Exception):
+    """The compiled snapshot is missing, unreadable, or older than its source CSVs"""
+
+
+def default_snapshot_path(data_path: Path) -> Path:
+    return data_path / SNAPSHOT_DIRNAME
+
+
+def _encode_column(values: Sequence[Any]) -> Tuple[str, Dict[str, np.ndarray]]:
+    """Pick a storage kind for a column and encode it into arrays"""
+    nulls = np.array([value is None for value in values], dtype=bool)
+    present = [value for value in values if value is not None]
+    arrays = {"nulls": nulls} if nulls.any() else {}
+
+    if present and all(isinstance(value, bool) for value in present):
+        kind, dtype = "bool", bool
+    elif present and all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        kind, dtype = "int", np.int64
+    elif all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        kind, dtype = "float", np.float64
+    else:
+        # Strings (and any mixed column) go into a UTF-8 blob addressed by offsets
+        encoded = [b"" if value is None else str(value).encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(chunk) for chunk in encoded])
+        arrays["data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        arrays["offsets"] = offsets
+        return "str", arrays
+
+    arrays["values"] = np.array([0 if value is None else value for value in values], dtype=dtype)
+    return kind, arrays
+
+
+class _ArrayWriter:
+    """Appends arrays to one data file at aligned offsets, recording where each one lives"""
+
+    ALIGNMENT = 64
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+
+    def write(self, array: np.ndarray) -> Dict[str, Any]:
+        padding = -self.offset % self.ALIGNMENT
+        self.f.write(b"\0" * padding)
+        self.offset += padding
+
+        array = np.ascontiguousarray(array)
+        spec = {"offset": self.offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        self.f.write(array.tobytes())
+        self.offset += array.nbytes
+        return spec
+
+
+# Derives named arrays (indexes, matrices) from the parsed tables at build time
+ArrayCompiler = Callable[[Dict[str, Table]], Dict[str, np.ndarray]]
+
+
+def build_snapshot(
+    data_path: Path, snapshot_path: Optional[Path] = None, compile_arrays: Optional[ArrayCompiler] = None
+) -> Path:
+    """Compile the catalog CSVs into a versioned, memory-mappable snapshot directory
+
+    All arrays go into one aligned data file; manifest.json records the format
+    version, the source CSV stats and the offset/dtype/shape of every array.
+    compile_arrays can add derived arrays, which every process loading the
+    snapshot then maps from the same file instead of building its own copy.
+    """
+    snapshot_path = snapshot_path or default_snapshot_path(data_path)
+    # Stat before reading, so edits made during the build leave the snapshot stale
+    sources = source_stats(data_path)
+    tables = read_csv_tables(data_path)
+
+    # Per-process scratch names, so workers rebuilding at the same time don't collide
+    tmp_path = snapshot_path.with_name(f"{snapshot_path.name}.tmp{os.getpid()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    manifest: Dict[str, Any] = {
+        "format_version": FORMAT_VERSION,
+        "built_at": datetime.now().isoformat(),
+        "sources": sources,
+        "tables": {},
+        "arrays": {},
+    }
+    with open(tmp_path / DATA_FILE, "wb") as f:
+        writer = _ArrayWriter(f)
+        for table_name, table in tables.items():
+            columns: List[Dict[str, Any]] = []
+            for column_name, values in table.columns.items():
+                kind, arrays = _encode_column(values)
+                parts = {part: writer.write(array) for part, array in arrays.items()}
+                columns.append({"name": column_name, "kind": kind, "arrays": parts})
+            manifest["tables"][table_name] = {"rows": len(table), "columns": columns}
+        if compile_arrays is not None:
+            for name, array in compile_arrays(tables).items():
+                manifest["arrays"][name] = writer.write(array)
+
+    # Manifest last: a directory without one is never loaded
+    with open(tmp_path / MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_path = snapshot_path.with_name(f"{snapshot_path.name}.old{os.getpid()}")
+    shutil.rmtree(old_path, ignore_errors=True)
+    if snapshot_path.exists():
+        snapshot_path.rename(old_path)
+    tmp_path.rename(snapshot_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return snapshot_path
+
+
+def load_snapshot(
+    data_path: Path, snapshot_path: Optional[Path] = None
+) -> Tuple[Dict[str, Table], Dict[str, np.ndarray]]:
+    """Memory-map a compiled snapshot as (tables, compiled arrays)
+
+    Columns and arrays are read-only views into a single shared mapping of
+    the data file, so nothing is copied until a value is actually read and
+    every process mapping the same snapshot shares its pages. Raises
+    SnapshotUnavailable if the snapshot can't be used.
+    """
+    snapshot_path = snapshot_path or default_snapshot_path(data_path)
+    try:
+        with open(snapshot_path / MANIFEST, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise SnapshotUnavailable(f"No readable snapshot at {snapshot_path}: {e}")
+
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise SnapshotUnavailable(f"Snapshot format {manifest.get('format_version')} != {FORMAT_VERSION}")
+    try:
+        current_sources = source_stats(data_path)
+    except OSError as e:
+        raise SnapshotUnavailable(f"Cannot stat catalog sources: {e}")
+    if current_sources != manifest.get("sources"):
+        raise SnapshotUnavailable("Snapshot is older than its source CSVs")
+
+    try:
+        data_file = snapshot_path / DATA_FILE
+        buffer = np.memmap(data_file, dtype=np.uint8, mode="r") if data_file.stat().st_size else np.zeros(0, np.uint8)
+
+        def view(spec: Dict[str, Any]) -> np.ndarray:
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            data = buffer[spec["offset"]:spec["offset"] + count * dtype.itemsize]
+            return data.view(dtype).reshape(spec["shape"])
+
+        def array(parts: Dict[str, Dict[str, Any]], part: str) -> Optional[np.ndarray]:
+            return view(parts[part]) if part in parts else None
+
+        tables = {}
+        for table_name, spec in manifest["tables"].items():
+            columns: Dict[str, Sequence] = {}
+            for column in spec["columns"]:
+                parts = column["arrays"]
+                if column["kind"] == "str":
+                    columns[column["name"]] = StringColumn(array(parts, "data"), array(parts, "offsets"), array(parts, "nulls"))
+                else:
+                    columns[column["name"]] = NumericColumn(array(parts, "values"), array(parts, "nulls"))
+            tables[table_name] = Table(columns)
+        arrays = {name: view(spec) for name, spec in manifest["arrays"].items()}
+    except (OSError, ValueError, KeyError) as e:
+        raise SnapshotUnavailable(f"Snapshot at {snapshot_path} is incomplete: {e}")
+    return tables, arrays
+
+
+def build_snapshot_subprocess(data_path: Path, timeout: float = 120.0) -> bool:
+    """Compile the snapshot in a child interpreter, keeping pandas out of this process
+
+    Returns False if the build failed (e.g. the data directory is read-only).
+    """
+    command = [sys.executable, "-m", "app.catalog", "build", "--data-path", str(Path(data_path).resolve())]
+    try:
+        result = subprocess.run(command, cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Catalog snapshot build failed: {e}")
+        return False
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        print(f"Catalog snapshot build failed: {lines[-1] if lines else f'exit status {result.returncode}'}")
+        return False
+    return True
+
+
+def load_tables(
+    data_path: Path, build_missing: bool = True
+) -> Tuple[Dict[str, Table], Dict[str, np.ndarray], str]:
+    """(tables, compiled arrays, source) from the compiled snapshot when it is fresh, else from the CSVs
+
+    A missing or stale snapshot is first rebuilt in a child process (when
+    build_missing is set), so serving processes only ever map the compiled
+    arrays and never import pandas. Reading the CSVs in-process is the last
+    resort.
+    """
+    try:
+        return (*load_snapshot(data_path), "snapshot")
+    except SnapshotUnavailable as e:
+        print(f"Catalog snapshot not used ({e})")
+
+    if build_missing and build_snapshot_subprocess(data_path):
+        try:
+            return (*load_snapshot(data_path), "snapshot")
+        except SnapshotUnavailable as e:
+            print(f"Rebuilt catalog snapshot not used ({e})")
+
+    print("Reading catalog CSV files")
+    return read_csv_tables(data_path), {}, "csv"
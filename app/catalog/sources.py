@@ -0,0 +1,32 @@
+from pathlib import Path
+from typing import Dict
+
+from app.catalog.table import Table
+
+# Catalog tables and the CSV files they are read from
+CATALOG_FILES = {
+    "ingredients": "ingredients.csv",
+    "products": "products.csv",
+    "product_ingredients": "product_ingredients.csv",
+    "interactions": "interactions.csv",
+    "treatments": "treatments.csv",
+    "treatment_rules": "treatment_rules.csv",
+    "scoring_labels": "scoring_labels.csv",
+    "common_names": "common_names.csv",
+}
+
+
+def read_csv_tables(data_path: Path) -> Dict[str, Table]:
+    """Parse every catalog CSV into a Table"""
+    import pandas as pd
+
+    return {name: Table.from_dataframe(pd.read_csv(data_path / filename)) for name, filename in CATALOG_FILES.items()}
+
+
+def source_stats(data_path: Path) -> Dict[str, Dict[str, int]]:
+    """Size and mtime of each catalog CSV, used to tell whether a snapshot is stale"""
+    stats = {}
+    for filename in CATALOG_FILES.values():
+        stat = (data_path / filename).stat()
+        stats[filename] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return stats
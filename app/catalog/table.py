@@ -0,0 +1,97 @@
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+
+class NumericColumn(Sequence):
+    """Numeric/boolean column backed by a (possibly memory-mapped) NumPy array"""
+
+    def __init__(self, values: np.ndarray, nulls: Optional[np.ndarray] = None):
+        self.values = values
+        self.nulls = nulls
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, i: int) -> Any:
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return self.values[i].item()
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.tolist())
+
+    def tolist(self) -> List[Any]:
+        values = self.values.tolist()
+        if self.nulls is not None:
+            for i in np.flatnonzero(self.nulls).tolist():
+                values[i] = None
+        return values
+
+
+class StringColumn(Sequence):
+    """String column stored as one UTF-8 blob plus offsets; values are decoded on access"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, nulls: Optional[np.ndarray] = None):
+        self.data = data
+        self.offsets = offsets
+        self.nulls = nulls
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        return (self[i] for i in range(len(self)))
+
+    def tolist(self) -> List[Optional[str]]:
+        return list(self)
+
+
+class Table:
+    """Read-only columnar table of equal-length columns, with None for missing values
+
+    Columns are plain lists (when ingested from CSV) or NumPy-backed columns
+    (when loaded from a compiled snapshot); either way they only need to
+    support len(), indexing and iteration.
+    """
+
+    def __init__(self, columns: Dict[str, Sequence]):
+        self.columns = columns
+        self._length = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_dataframe(cls, df: Any) -> "Table":
+        """Convert a pandas DataFrame, turning NaN/NaT into None"""
+        columns = {}
+        for name in df.columns:
+            series = df[name]
+            missing = series.isna().tolist()
+            columns[str(name)] = [None if is_missing else value for value, is_missing in zip(series.tolist(), missing)]
+        return cls(columns)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __getitem__(self, name: str) -> Sequence:
+        return self.columns[name]
+
+    @property
+    def empty(self) -> bool:
+        return self._length == 0
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """Iterate rows as {column: value} dicts"""
+        names = list(self.columns)
+        for values in zip(*(self.columns[name] for name in names)):
+            yield dict(zip(names, values))
+
+    def records(self) -> List[Dict[str, Any]]:
+        """All rows as a list of {column: value} dicts"""
+        return list(self.rows())
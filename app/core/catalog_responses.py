@@ -0,0 +1,74 @@
+import threading
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.core.catalog_snapshot import CatalogSnapshot
+from app.core.db import data_manager
+from app.core.responses import PreparedJSON, encode_json
+
+# The catalog only changes on reload, and clients revalidate cheaply by ETag
+CATALOG_CACHE_CONTROL = "public, max-age=60"
+
+
+def _render(index: Mapping[int, BaseModel]) -> Tuple[PreparedJSON, Dict[int, PreparedJSON]]:
+    """Serialize each model once; the list body is the item bodies joined"""
+    bodies = {key: encode_json(jsonable_encoder(model)) for key, model in index.items()}
+    listing = PreparedJSON.from_body(b"[" + b",".join(bodies.values()) + b"]", CATALOG_CACHE_CONTROL)
+    return listing, {key: PreparedJSON.from_body(body, CATALOG_CACHE_CONTROL) for key, body in bodies.items()}
+
+
+class CatalogResponses:
+    """Product and ingredient responses rendered from one catalog snapshot"""
+
+    def __init__(self, catalog: CatalogSnapshot):
+        self.version = catalog.version
+        self.products, self.product_by_id = _render(catalog.product_index)
+        self.ingredients, self.ingredient_by_id = _render(catalog.ingredient_index)
+
+    def product_list(self, product_ids: Iterable[int]) -> PreparedJSON:
+        """A listing of some products, joined from their prepared bodies"""
+        bodies = (self.product_by_id[pid].body for pid in product_ids if pid in self.product_by_id)
+        return PreparedJSON.from_body(b"[" + b",".join(bodies) + b"]", CATALOG_CACHE_CONTROL)
+
+
+class CatalogResponseCache:
+    """Renders the catalog responses once per (re)load and serves them until the next
+
+    Rendering the whole catalog takes a while, so it never runs on the event
+    loop: reloads render the new responses on the reloading thread, and
+    handlers that still find them missing use get_async().
+    """
+
+    def __init__(self):
+        self._current: Optional[CatalogResponses] = None
+        self._lock = threading.Lock()
+        data_manager.add_reload_listener(self.refresh)
+
+    def get(self) -> CatalogResponses:
+        catalog = data_manager.snapshot
+        current = self._current
+        if current is None or current.version != catalog.version:
+            with self._lock:
+                current = self._current
+                if current is None or current.version != catalog.version:
+                    current = CatalogResponses(catalog)
+                    self._current = current
+        return current
+
+    async def get_async(self) -> CatalogResponses:
+        """get() for async handlers: a render happens on a worker thread"""
+        current = self._current
+        if current is not None and current.version == data_manager.snapshot.version:
+            return current
+        return await run_in_threadpool(self.get)
+
+    def refresh(self):
+        """Render the responses for the catalog just loaded (reload listener)"""
+        self.get()
+
+
+# Global catalog response cache
+catalog_responses = CatalogResponseCache()
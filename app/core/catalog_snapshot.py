@@ -0,0 +1,301 @@
+import ast
+import hashlib
+import json
+import uuid
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from app.catalog import CATALOG_FILES, Table, load_tables, source_stats
+from app.core.ingredient_product_index import IngredientProductIndex
+from app.core.interaction_index import InteractionIndex
+from app.core.score_matrix import ScoreMatrix
+from app.models.ingredient import IngredientInfo
+from app.models.product import ProductInfo
+
+def _parse_literal(value: Any, default: Any) -> Any:
+    """Parse a stringified Python literal from a CSV cell, falling back to default"""
+    try:
+        if isinstance(value, str):
+            return ast.literal_eval(value)
+    except Exception:
+        pass
+    return default
+
+class CatalogSnapshot:
+    """One immutable version of the catalog: source tables plus every lookup built from them
+    
+    A snapshot is fully built before anyone can see it and is never mutated
+    afterwards, so a request that holds on to one gets a consistent catalog
+    even while a reload swaps in a newer snapshot.
+    """
+    
+    def __init__(
+        self,
+        tables: Dict[str, Table],
+        version: int,
+        source: str = "csv",
+        arrays: Optional[Mapping[str, np.ndarray]] = None,
+        fingerprint: Optional[str] = None,
+    ):
+        self.version = version
+        self.source = source  # "snapshot" (compiled binary) or "csv"
+        # Identifies the catalog contents across reloads and restarts; unknown sources never match
+        self.fingerprint = fingerprint or uuid.uuid4().hex
+        # Prebuilt index/matrix arrays mapped from the compiled snapshot, if any
+        self.arrays = arrays or {}
+        self.ingredients = tables["ingredients"]
+        self.products = tables["products"]
+        self.product_ingredients = tables["product_ingredients"]
+        self.interactions = tables["interactions"]
+        self.treatments = tables["treatments"]
+        self.treatment_rules = tables["treatment_rules"]
+        self.scoring_labels = tables["scoring_labels"]
+        self.common_names = tables["common_names"]
+        
+        # Create lookup dictionaries for performance
+        self._build_lookups()
+    
+    @classmethod
+    def load(cls, data_path: Path, version: int) -> "CatalogSnapshot":
+        """Load the compiled binary snapshot if it is fresh, otherwise all CSV files"""
+        # Stat before reading, so edits made during the load change the next fingerprint
+        sources = json.dumps(source_stats(data_path), sort_keys=True)
+        tables, arrays, source = load_tables(data_path)
+        return cls(tables, version, source, arrays, hashlib.sha1(sources.encode()).hexdigest())
+    
+    @classmethod
+    def empty(cls, version: int) -> "CatalogSnapshot":
+        """Create a snapshot of empty tables as fallback"""
+        return cls({name: Table({}) for name in CATALOG_FILES}, version)
+    
+    def _build_lookups(self):
+        """Build lookup dictionaries for fast access"""
+        # Ingredient lookups
+        if not self.ingredients.empty:
+            self.ingredient_lookup = dict(zip(self.ingredients["id"], self.ingredients["inci_name"]))
+            self.name_to_id = {name.lower(): _id for _id, name in zip(self.ingredients["id"], self.ingredients["inci_name"])}
+        else:
+            self.ingredient_lookup = {}
+            self.name_to_id = {}
+        
+        # Interaction lookups
+        if not self.interactions.empty:
+            self.interaction_lookup = {}
+            for row in self.interactions.rows():
+                key = tuple(sorted([int(row["a_id"]), int(row["b_id"])]))
+                self.interaction_lookup[key] = {
+                    "interaction_type": row["interaction_type"],
+                    "effect": row["effect"],
+                    "details": row["details"]
+                }
+        else:
+            self.interaction_lookup = {}
+        compiled = self._compiled_arrays("interaction_index", InteractionIndex.ARRAYS)
+        if compiled is not None:
+            self.interaction_index = InteractionIndex.from_arrays(self.interaction_lookup, compiled)
+        else:
+            self.interaction_index = InteractionIndex.build(self.interaction_lookup)
+        
+        # Common names lookup
+        if not self.common_names.empty:
+            self.common_names_lookup = {}
+            for row in self.common_names.rows():
+                self.common_names_lookup[row["name"].lower()] = row["inci_id"]
+        else:
+            self.common_names_lookup = {}
+
+        # Catalog index: prebuilt models keyed by id, so accessors never scan
+        self._build_catalog_index()
+
+    def _build_catalog_index(self):
+        """Build the immutable id -> model index used by every accessor"""
+        # Product -> ingredient IDs (only positive IDs, in file order)
+        product_ingredient_ids: Dict[int, List[int]] = {}
+        if not self.product_ingredients.empty:
+            for product_id, ing in zip(self.product_ingredients["product_id"], self.product_ingredients["ingredient_id"]):
+                # Filter out negative IDs (these seem to be placeholders in your data)
+                ids = product_ingredient_ids.setdefault(int(product_id), [])
+                if ing is not None and ing > 0:
+                    ids.append(int(ing))
+        self.product_ingredient_index: Mapping[int, Tuple[int, ...]] = MappingProxyType(
+            {product_id: tuple(ids) for product_id, ids in product_ingredient_ids.items()}
+        )
+
+        # Ingredients with parsed category scores
+        category_scores: Dict[int, Dict[str, float]] = {}
+        ingredient_index: Dict[int, IngredientInfo] = {}
+        if not self.ingredients.empty:
+            for row in self.ingredients.rows():
+                ingredient_id = int(row["id"])
+                if ingredient_id in ingredient_index:
+                    continue  # First row wins, as with the old boolean-mask lookup
+                scores = _parse_literal(row.get("category_score"), {})
+                try:
+                    ingredient_index[ingredient_id] = IngredientInfo(
+                        id=ingredient_id,
+                        name=row["inci_name"],
+                        function=row.get("function", ""),
+                        ph=row.get("ph"),
+                        comedogenic_rating=row.get("comedogenic_rating", 0),
+                        fungal_acne_safe=row.get("fungal_acne_safe", True),
+                        irritancy_rating=row.get("irritancy_rating", 0),
+                        description=row.get("description", ""),
+                        category_scores=scores
+                    )
+                except Exception as e:
+                    print(f"Skipping ingredient {ingredient_id}: {e}")
+                    continue
+                category_scores[ingredient_id] = ingredient_index[ingredient_id].category_scores
+        self.category_score_index: Mapping[int, Dict[str, float]] = MappingProxyType(category_scores)
+        self.ingredient_index: Mapping[int, IngredientInfo] = MappingProxyType(ingredient_index)
+
+        # Products with their ingredient IDs and parsed INCI lists
+        product_index: Dict[int, ProductInfo] = {}
+        if not self.products.empty:
+            for row in self.products.rows():
+                product_id = int(row["product_id"])
+                if product_id in product_index:
+                    continue
+                try:
+                    product_index[product_id] = ProductInfo(
+                        product_id=product_id,
+                        brand_name=row["brand_name"],
+                        product_name=row["product_name"],
+                        target_area=row.get("target_area", ""),
+                        ingredient_ids=list(self.product_ingredient_index.get(product_id, ())),
+                        inci_ingredients=_parse_literal(row.get("inci_ingredients"), []),
+                        product_type=row["product_type"],
+                        product_texture=row.get("product_texture", ""),
+                    )
+                except Exception as e:
+                    print(f"Skipping product {product_id}: {e}")
+        self.product_index: Mapping[int, ProductInfo] = MappingProxyType(product_index)
+        self.product_ids = np.array(sorted(product_index), dtype=np.int64)
+        # And the inverse: ingredient -> sorted IDs of catalog products, for containment queries
+        compiled = self._compiled_arrays("ingredient_products", IngredientProductIndex.ARRAYS)
+        if compiled is not None:
+            self.ingredient_products = IngredientProductIndex.from_arrays(compiled)
+        else:
+            self.ingredient_products = IngredientProductIndex.build(self.product_ingredient_index, product_index)
+        products_by_type: Dict[str, List[int]] = {}
+        for product_id, product in product_index.items():
+            products_by_type.setdefault(str(product.product_type).strip().lower(), []).append(product_id)
+        self.products_by_type: Mapping[str, Tuple[int, ...]] = MappingProxyType(
+            {product_type: tuple(ids) for product_type, ids in products_by_type.items()}
+        )
+
+        # Treatments and their rules keyed by treatment_id (first treatment row wins)
+        treatment_index: Dict[int, Dict] = {}
+        for row in self.treatments.rows():
+            treatment_index.setdefault(row["treatment_id"], row)
+        self.treatment_index: Mapping[int, Dict] = MappingProxyType(treatment_index)
+        treatment_rules: Dict[int, List[Dict]] = {}
+        for row in self.treatment_rules.rows():
+            treatment_rules.setdefault(row["treatment_id"], []).append(row)
+        self.treatment_rules_index: Mapping[int, Tuple[Dict, ...]] = MappingProxyType(
+            {treatment_id: tuple(rules) for treatment_id, rules in treatment_rules.items()}
+        )
+
+        # Ingredient x category score matrix keyed by the scoring label names
+        compiled = self._compiled_arrays("score_matrix", ScoreMatrix.ARRAYS)
+        score_matrix = ScoreMatrix.from_arrays(compiled) if compiled is not None else None
+        if score_matrix is None or (
+            set(score_matrix.ingredient_ids) != set(self.category_score_index)
+            or set(score_matrix.product_ids) != set(self.product_ingredient_index)
+        ):
+            categories = list(self.scoring_labels["Name"]) if "Name" in self.scoring_labels else []
+            score_matrix = ScoreMatrix.build(
+                categories, self.category_score_index, self.interaction_lookup, self.product_ingredient_index
+            )
+        self.score_matrix = score_matrix
+
+    def _compiled_arrays(self, prefix: str, names: Tuple[str, ...]) -> Optional[Dict[str, np.ndarray]]:
+        """Arrays stored as "<prefix>.<name>" in the compiled snapshot, or None if any is missing"""
+        keys = [f"{prefix}.{name}" for name in names]
+        if not all(key in self.arrays for key in keys):
+            return None
+        return {name: self.arrays[key] for name, key in zip(names, keys)}
+
+    def compile_arrays(self) -> Dict[str, np.ndarray]:
+        """Index and matrix arrays to store in the compiled snapshot for _compiled_arrays()"""
+        arrays = {}
+        for prefix, structure in (
+            ("interaction_index", self.interaction_index),
+            ("ingredient_products", self.ingredient_products),
+            ("score_matrix", self.score_matrix),
+        ):
+            arrays.update({f"{prefix}.{name}": array for name, array in structure.to_arrays().items()})
+        return arrays
+
+    def get_ingredient_by_id(self, ingredient_id: int) -> Optional[IngredientInfo]:
+        """Get ingredient by ID"""
+        return self.ingredient_index.get(ingredient_id)
+    
+    def get_product_by_id(self, product_id: int) -> Optional[ProductInfo]:
+        """Get product by ID"""
+        return self.product_index.get(product_id)
+    
+    def get_product_ingredient_ids(self, product_id: int) -> List[int]:
+        """Get ingredient IDs for a product (only positive IDs)"""
+        return list(self.product_ingredient_index.get(product_id, ()))
+    
+    def find_product_ids(self, contains: Iterable[int] = (), excludes: Iterable[int] = ()) -> List[int]:
+        """IDs of catalog products containing every ingredient in contains and none in excludes"""
+        return self.ingredient_products.query(self.product_ids, contains, excludes).tolist()
+    
+    def get_treatment_ingredient_ids(self, treatment_id: int) -> List[int]:
+        """IDs of every ingredient a treatment's rules flag"""
+        return sorted({int(rule["ingredient_id"]) for rule in self.treatment_rules_index.get(treatment_id, ())})
+    
+    def get_all_products(self) -> List[ProductInfo]:
+        """Get all products"""
+        return list(self.product_index.values())
+    
+    def get_all_ingredients(self) -> List[IngredientInfo]:
+        """Get all ingredients"""
+        return list(self.ingredient_index.values())
+    
+    def resolve_ingredient_name(self, name: str) -> Optional[int]:
+        """Resolve ingredient name to ID with exact and common name matching"""
+        # Try exact match first
+        exact_match = self.name_to_id.get(name.lower())
+        if exact_match:
+            return exact_match
+        
+        # Try common names
+        common_match = self.common_names_lookup.get(name.lower())
+        if common_match:
+            return common_match
+        
+        return None
+    
+    def resolve_ingredient(self, name_or_id: str) -> Optional[int]:
+        """Resolve an ingredient given by ID (if it exists) or by name/common name"""
+        name_or_id = str(name_or_id).strip()
+        try:
+            ing_id = int(name_or_id)  # Try as ID first
+        except ValueError:
+            return self.resolve_ingredient_name(name_or_id)
+        return ing_id if ing_id in self.ingredient_index else None
+    
+    def get_interaction(self, ing_a: int, ing_b: int) -> Optional[Dict]:
+        """Get interaction between two ingredients"""
+        key = tuple(sorted([ing_a, ing_b]))
+        return self.interaction_lookup.get(key)
+    
+    def get_treatment_rules(self, treatment_id: int) -> List[Dict]:
+        """Get treatment rules for a specific treatment"""
+        return [dict(rule) for rule in self.treatment_rules_index.get(treatment_id, ())]
+    
+    def get_treatment_info(self, treatment_id: int) -> Optional[Dict]:
+        """Get treatment information"""
+        treatment = self.treatment_index.get(treatment_id)
+        return dict(treatment) if treatment is not None else None
+
+
+def compile_catalog_arrays(tables: Dict[str, Table]) -> Dict[str, np.ndarray]:
+    """build_snapshot() hook: derive the index and matrix arrays from freshly parsed tables"""
+    return CatalogSnapshot(tables, version=0).compile_arrays()
@@ -0,0 +1,132 @@
+import csv
+from pathlib import Path
+from typing import Dict, List
+
+from app.core.responses import PreparedJSON
+
+# Fallbacks used when the configuration CSVs cannot be read
+DEFAULT_PRODUCT_TYPE_ORDERS = {
+    "cleanser": 1,
+    "exfoliator": 2,
+    "toner": 3,
+    "essence": 4,
+    "serum": 5,
+    "ampule": 5,
+    "spot_treatment": 5,
+    "concentrate": 5,
+    "sheet_mask": 6,
+    "eye_cream": 7,
+    "eye_serum": 7,
+    "moisturizer": 8,
+    "gel_cream": 8,
+    "sleeping_mask": 8,
+    "face_oil": 9,
+    "sun_protection": 10
+}
+
+DEFAULT_STEP_DISPLAY_NAMES = {
+    1: "Cleanser",
+    2: "Exfoliator",
+    3: "Toner and Essence",
+    4: "Toner and Essence",
+    5: "Treatment",
+    6: "Sheet Mask",
+    7: "Eye Care",
+    8: "Moisturizer",
+    9: "Face Oil",
+    10: "Sun Protection",
+    999: "Additional Care"
+}
+
+DEFAULT_TEXTURE_ORDERS = {
+    'water': 1,
+    'mist': 1,
+    'essence': 2,
+    'gel': 3,
+    'lotion': 4,
+    'serum': 4,
+    'cream': 5,
+    'balm': 6,
+    'oil': 7,
+    'thick_cream': 6,
+    'paste': 7
+}
+
+
+class ConfigRegistry:
+    """Step, texture and scoring-category configuration, parsed once from the data CSVs
+
+    Besides the lookup dicts used by RoutineService, every /config response body
+    is serialized to JSON bytes (with an ETag) at load time. Load errors are kept
+    per response so the endpoints can still report them.
+    """
+
+    def __init__(self, data_path: str = "data"):
+        self.data_path = Path(data_path)
+        self.load()
+
+    def _read_csv(self, filename: str) -> List[Dict[str, str]]:
+        with open(self.data_path / filename, newline="", encoding="utf-8-sig") as f:
+            return list(csv.DictReader(f))
+
+    def load(self):
+        """(Re)parse the configuration CSVs and prepare the response bodies"""
+        self.responses: Dict[str, PreparedJSON] = {}
+        self.errors: Dict[str, Exception] = {}
+
+        # Product types: name -> order, order -> display name (first one wins)
+        try:
+            rows = self._read_csv("product_type_order.csv")
+            self.product_type_orders = {row['name']: int(row['order']) for row in rows}
+            self.step_display_names = {}
+            for row in rows:
+                self.step_display_names.setdefault(int(row['order']), row['display_name'])
+            # Add default for unknown products
+            self.step_display_names[999] = "Additional Care"
+
+            self.responses["step-names"] = PreparedJSON(self.step_display_names)
+            self.responses["product-types"] = PreparedJSON([
+                {
+                    "id": int(row['id']),
+                    "order": int(row['order']),
+                    "name": row['name'],
+                    "type": row['type'],
+                    "display_name": row['display_name']
+                }
+                for row in rows
+            ])
+            print(f"Loaded {len(self.product_type_orders)} product types and {len(self.step_display_names)} step names")
+        except Exception as e:
+            print(f"Error loading product type data: {e}")
+            self.errors["step-names"] = self.errors["product-types"] = e
+            self.product_type_orders = dict(DEFAULT_PRODUCT_TYPE_ORDERS)
+            self.step_display_names = dict(DEFAULT_STEP_DISPLAY_NAMES)
+
+        # Texture orders for sub-sorting within a step
+        try:
+            self.texture_orders = {row['name']: int(row['order']) for row in self._read_csv("product_texture_order.csv")}
+            self.responses["texture-orders"] = PreparedJSON(self.texture_orders)
+        except FileNotFoundError as e:
+            print(f"Error loading product texture orders (file may not exist yet): {e}")
+            self.texture_orders = dict(DEFAULT_TEXTURE_ORDERS)
+            self.responses["texture-orders"] = PreparedJSON(self.texture_orders)
+        except Exception as e:
+            print(f"Error loading product texture orders: {e}")
+            self.errors["texture-orders"] = e
+            self.texture_orders = dict(DEFAULT_TEXTURE_ORDERS)
+
+        # Scoring category labels
+        try:
+            self.scoring_categories = [
+                {"id": int(row['id']), "name": row['Name']}
+                for row in self._read_csv("scoring_labels.csv")
+            ]
+            self.responses["categories"] = PreparedJSON(self.scoring_categories)
+        except Exception as e:
+            print(f"Error loading categories: {e}")
+            self.errors["categories"] = e
+            self.scoring_categories = []
+
+
+# Global config registry instance
+config_registry = ConfigRegistry()
@@ -1,216 +1,105 @@
-import ast
-import pandas as pd
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-from app.models.ingredient import IngredientInfo
-from app.models.product import ProductInfo
+from typing import Any, Callable, Dict, List, Optional
+from app.catalog import CATALOG_FILES
+from app.core.catalog_snapshot import CatalogSnapshot
+
 
 class DataManager:
-    """Handles all data loading and basic queries from CSV files"""
+    """Handles catalog loading and serves queries from the current catalog snapshot
+    
+    Catalog attributes and query methods (products, get_product_by_id, ...)
+    are looked up on the current snapshot. A reload builds a complete new
+    snapshot off to the side and publishes it with a single reference
+    assignment; code that needs several consistent reads should take
+    `data_manager.snapshot` once and use it throughout.
+    """
     
     def __init__(self, data_path: str = "data"):
         self.data_path = Path(data_path)
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self.reload_stats = {
+            "reload_count": 0,
+            "last_reload_ms": None,
+            "last_reload_at": None,
+            "last_reload_error": None,
+            "source": None,
+        }
+        self._reload_listeners: List[Callable[[], None]] = []
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
         self.load_data()
     
-    def load_data(self):
-        """Load all CSV data with error handling"""
-        try:
-            # Load CSV files
-            self.ingredients = pd.read_csv(self.data_path / "ingredients.csv")
-            self.products = pd.read_csv(self.data_path / "products.csv") 
-            self.product_ingredients = pd.read_csv(self.data_path / "product_ingredients.csv")
-            self.interactions = pd.read_csv(self.data_path / "interactions.csv")
-            self.treatments = pd.read_csv(self.data_path / "treatments.csv")
-            self.treatment_rules = pd.read_csv(self.data_path / "treatment_rules.csv")
-            self.scoring_labels = pd.read_csv(self.data_path / "scoring_labels.csv")
-            self.common_names = pd.read_csv(self.data_path / "common_names.csv")
-            
-            # Create lookup dictionaries for performance
-            self._build_lookups()
-            
-        except Exception as e:
-            print(f"Error loading data: {e}")
-            self._create_empty_dataframes()
-    
-    def _create_empty_dataframes(self):
-        """Create empty dataframes as fallback"""
-        self.ingredients = pd.DataFrame()
-        self.products = pd.DataFrame()
-        self.product_ingredients = pd.DataFrame()
-        self.interactions = pd.DataFrame()
-        self.treatments = pd.DataFrame()
-        self.treatment_rules = pd.DataFrame()
-        self.scoring_labels = pd.DataFrame()
-        self.common_names = pd.DataFrame()
-        self._build_lookups()
-    
-    def _build_lookups(self):
-        """Build lookup dictionaries for fast access"""
-        # Ingredient lookups
-        if not self.ingredients.empty:
-            self.ingredient_lookup = dict(zip(self.ingredients["id"], self.ingredients["inci_name"]))
-            self.name_to_id = {name.lower(): _id for _id, name in zip(self.ingredients["id"], self.ingredients["inci_name"])}
-        else:
-            self.ingredient_lookup = {}
-            self.name_to_id = {}
-        
-        # Interaction lookups
-        if not self.interactions.empty:
-            self.interaction_lookup = {}
-            for _, row in self.interactions.iterrows():
-                key = tuple(sorted([row["a_id"], row["b_id"]]))
-                self.interaction_lookup[key] = {
-                    "interaction_type": row["interaction_type"],
-                    "effect": row["effect"],
-                    "details": row["details"]
-                }
-        else:
-            self.interaction_lookup = {}
-        
-        # Common names lookup
-        if not self.common_names.empty:
-            self.common_names_lookup = {}
-            for _, row in self.common_names.iterrows():
-                self.common_names_lookup[row["name"].lower()] = row["inci_id"]
-        else:
-            self.common_names_lookup = {}
-    
-    def get_ingredient_by_id(self, ingredient_id: int) -> Optional[IngredientInfo]:
-        """Get ingredient by ID"""
-        if self.ingredients.empty:
-            return None
-        
-        ingredient = self.ingredients[self.ingredients["id"] == ingredient_id]
-        if ingredient.empty:
-            return None
-        
-        row = ingredient.iloc[0]
-        
-        # Parse category scores
-        category_scores = {}
-        try:
-            if pd.notna(row.get("category_score")) and isinstance(row["category_score"], str):
-                category_scores = ast.literal_eval(row["category_score"])
-        except:
-            pass
-        
-        return IngredientInfo(
-            id=row["id"],
-            name=row["inci_name"],
-            function=row.get("function", ""),
-            ph=row.get("ph"),
-            comedogenic_rating=row.get("comedogenic_rating", 0),
-            fungal_acne_safe=row.get("fungal_acne_safe", True),
-            irritancy_rating=row.get("irritancy_rating", 0),
-            description=row.get("description", ""),
-            category_scores=category_scores
-        )
-    
-    def get_product_by_id(self, product_id: int) -> Optional[ProductInfo]:
-        """Get product by ID"""
-        if self.products.empty:
-            return None
-        
-        product = self.products[self.products["product_id"] == product_id]
-        if product.empty:
-            return None
-        
-        row = product.iloc[0]
-        
-        # Get ingredient IDs for this product
-        ingredient_ids = self.get_product_ingredient_ids(product_id)
-        
-        # Parse INCI ingredients list
-        inci_ingredients = []
-        try:
-            if pd.notna(row.get("inci_ingredients")) and isinstance(row["inci_ingredients"], str):
-                inci_ingredients = ast.literal_eval(row["inci_ingredients"])
-        except:
-            pass
-        
-        return ProductInfo(
-            product_id=row["product_id"],
-            brand_name=row["brand_name"],
-            product_name=row["product_name"],
-            target_area=row.get("target_area", ""),
-            ingredient_ids=ingredient_ids,
-            inci_ingredients=inci_ingredients,
-            product_type=row["product_type"],
-            product_texture=row.get("product_texture", ""),
-        )
-    
-    def get_product_ingredient_ids(self, product_id: int) -> List[int]:
-        """Get ingredient IDs for a product (only positive IDs)"""
-        if self.product_ingredients.empty:
-            return []
-        
-        product_ings = self.product_ingredients[
-            self.product_ingredients["product_id"] == product_id
-        ]
-        # Filter out negative IDs (these seem to be placeholders in your data)
-        return [int(ing) for ing in product_ings["ingredient_id"].tolist() if ing > 0]
-    
-    def get_all_products(self) -> List[ProductInfo]:
-        """Get all products"""
-        if self.products.empty:
-            return []
-        
-        products = []
-        for _, row in self.products.iterrows():
-            product = self.get_product_by_id(row["product_id"])
-            if product:
-                products.append(product)
-        return products
-    
-    def get_all_ingredients(self) -> List[IngredientInfo]:
-        """Get all ingredients"""
-        if self.ingredients.empty:
-            return []
-        
-        ingredients = []
-        for _, row in self.ingredients.iterrows():
-            ingredient = self.get_ingredient_by_id(row["id"])
-            if ingredient:
-                ingredients.append(ingredient)
-        return ingredients
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes not defined on the manager itself
+        snapshot = self.__dict__.get("snapshot")
+        if snapshot is None:
+            raise AttributeError(name)
+        return getattr(snapshot, name)
     
-    def resolve_ingredient_name(self, name: str) -> Optional[int]:
-        """Resolve ingredient name to ID with exact and common name matching"""
-        # Try exact match first
-        exact_match = self.name_to_id.get(name.lower())
-        if exact_match:
-            return exact_match
-        
-        # Try common names
-        common_match = self.common_names_lookup.get(name.lower())
-        if common_match:
-            return common_match
-        
-        return None
+    def add_reload_listener(self, callback: Callable[[], None]):
+        """Register a callback to run after every (re)load of the catalog"""
+        self._reload_listeners.append(callback)
     
-    def get_interaction(self, ing_a: int, ing_b: int) -> Optional[Dict]:
-        """Get interaction between two ingredients"""
-        key = tuple(sorted([ing_a, ing_b]))
-        return self.interaction_lookup.get(key)
+    def load_data(self) -> bool:
+        """Build a new snapshot from the CSV files and swap it in atomically
+        
+        If a reload fails the current snapshot stays in place; only the very
+        first load falls back to an empty catalog.
+        """
+        with self._reload_lock:
+            started = time.perf_counter()
+            version = self.snapshot.version + 1 if self.snapshot else 1
+            try:
+                snapshot = CatalogSnapshot.load(self.data_path, version)
+                error = None
+            except Exception as e:
+                print(f"Error loading data: {e}")
+                error = str(e)
+                snapshot = CatalogSnapshot.empty(version) if self.snapshot is None else None
+            
+            if snapshot is not None:
+                self.snapshot = snapshot  # The swap: one reference assignment
+            
+            self.reload_stats.update({
+                "reload_count": self.reload_stats["reload_count"] + 1,
+                "source": self.snapshot.source,
+                "last_reload_ms": round((time.perf_counter() - started) * 1000, 2),
+                "last_reload_at": datetime.now().isoformat(),
+                "last_reload_error": error,
+            })
+        
+        if snapshot is not None:
+            for callback in self._reload_listeners:
+                callback()
+        return error is None
     
-    def get_treatment_rules(self, treatment_id: int) -> List[Dict]:
-        """Get treatment rules for a specific treatment"""
-        if self.treatment_rules.empty:
-            return []
-        
-        rules = self.treatment_rules[self.treatment_rules["treatment_id"] == treatment_id]
-        return rules.to_dict(orient="records")
+    def _source_mtimes(self) -> Dict[str, float]:
+        mtimes = {}
+        for filename in CATALOG_FILES.values():
+            path = self.data_path / filename
+            mtimes[filename] = path.stat().st_mtime if path.exists() else 0.0
+        return mtimes
     
-    def get_treatment_info(self, treatment_id: int) -> Optional[Dict]:
-        """Get treatment information"""
-        if self.treatments.empty:
-            return None
-        
-        treatment = self.treatments[self.treatments["treatment_id"] == treatment_id]
-        if treatment.empty:
-            return None
-        
-        return treatment.iloc[0].to_dict()
+    def start_watching(self, interval: float):
+        """Poll the catalog CSVs in a background thread and reload when they change"""
+        if self._watcher is not None or interval <= 0:
+            return
+        
+        def watch():
+            last_seen = self._source_mtimes()
+            while True:
+                time.sleep(interval)
+                current = self._source_mtimes()
+                if current != last_seen:
+                    last_seen = current
+                    print("Catalog files changed, reloading")
+                    self.load_data()
+        
+        self._watcher = threading.Thread(target=watch, name="catalog-watcher", daemon=True)
+        self._watcher.start()
 
 # Global data manager instance
 data_manager = DataManager()
@@ -0,0 +1,90 @@
+import numpy as np
+from typing import Dict, Iterable, Mapping, Optional, Sequence
+
+
+class IngredientProductIndex:
+    """Inverted index: ingredient ID -> sorted IDs of the products containing it (CSR posting lists)"""
+
+    # Arrays that make up an index, as stored in the compiled catalog snapshot
+    ARRAYS = ("ingredient_ids", "indptr", "product_ids")
+
+    def __init__(self, ingredient_ids: np.ndarray, indptr: np.ndarray, product_ids: np.ndarray):
+        """Wrap prebuilt posting lists; the arrays may be read-only memory-mapped views"""
+        self.positions = {ing: pos for pos, ing in enumerate(ingredient_ids.tolist())}
+        self.indptr = indptr
+        self.product_ids = product_ids
+
+    @classmethod
+    def build(
+        cls, product_ingredients: Mapping[int, Sequence[int]], product_ids: Optional[Iterable[int]] = None
+    ) -> "IngredientProductIndex":
+        """Invert the product -> ingredient IDs mapping, keeping only product_ids (the catalog) if given"""
+        keep = set(product_ids) if product_ids is not None else None
+        postings: Dict[int, set] = {}
+        for product_id, ingredient_ids in product_ingredients.items():
+            if keep is not None and product_id not in keep:
+                continue
+            for ing in ingredient_ids:
+                postings.setdefault(int(ing), set()).add(int(product_id))
+
+        ingredient_ids = sorted(postings)
+        indptr = np.zeros(len(ingredient_ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(postings[ing]) for ing in ingredient_ids])
+        product_ids = np.fromiter(
+            (product_id for ing in ingredient_ids for product_id in sorted(postings[ing])),
+            dtype=np.int64,
+            count=int(indptr[-1]),
+        )
+        return cls(np.array(ingredient_ids, dtype=np.int64), indptr, product_ids)
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray]) -> "IngredientProductIndex":
+        return cls(*(arrays[name] for name in cls.ARRAYS))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """The arrays to store in a compiled snapshot, in from_arrays() form"""
+        return {
+            "ingredient_ids": np.array(list(self.positions), dtype=np.int64),
+            "indptr": self.indptr,
+            "product_ids": self.product_ids,
+        }
+
+    def products_with(self, ingredient_id: int) -> np.ndarray:
+        """Sorted IDs of the products containing an ingredient (a view, never copied)"""
+        pos = self.positions.get(ingredient_id)
+        if pos is None:
+            return self.product_ids[:0]
+        return self.product_ids[self.indptr[pos]:self.indptr[pos + 1]]
+
+    def query(self, universe: np.ndarray, contains: Iterable[int] = (), excludes: Iterable[int] = ()) -> np.ndarray:
+        """Sorted product IDs from universe containing every contains ingredient and none of excludes
+
+        Answered from the posting lists alone, which list only catalog
+        products: the shortest contains list is filtered by binary search in
+        the others, then excluded IDs are searched for and dropped. Cost
+        follows the posting lists involved, not the catalog size; universe
+        (the sorted catalog product IDs) is only the starting set when
+        nothing is required.
+        """
+        postings = sorted((self.products_with(ing) for ing in set(contains)), key=len)
+        result = postings[0] if postings else universe
+        for ids in postings[1:]:
+            if not len(result):
+                break
+            result = result[_positions_in(ids, result) >= 0]
+
+        excluded = [self.products_with(ing) for ing in set(excludes)]
+        if excluded and len(result):
+            drop = _positions_in(result, np.concatenate(excluded))
+            keep = np.ones(len(result), dtype=bool)
+            keep[drop[drop >= 0]] = False
+            result = result[keep]
+        return result
+
+
+def _positions_in(sorted_ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Index of each value in sorted_ids, or -1 where absent (binary search, nothing is sorted)"""
+    if not len(sorted_ids):
+        return np.full(len(values), -1, dtype=np.intp)
+    positions = np.minimum(np.searchsorted(sorted_ids, values), len(sorted_ids) - 1)
+    return np.where(sorted_ids[positions] == values, positions, -1)
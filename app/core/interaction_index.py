@@ -0,0 +1,123 @@
+import numpy as np
+from typing import Dict, FrozenSet, List, Mapping, Sequence, Tuple
+
+
+class InteractionIndex:
+    """Sparse ingredient adjacency (CSR over compact ids) built from interactions.csv"""
+
+    # Arrays that make up an index, as stored in the compiled catalog snapshot
+    ARRAYS = ("ids", "indptr", "indices")
+
+    def __init__(
+        self,
+        interaction_lookup: Mapping[Tuple[int, int], Dict],
+        ids: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+    ):
+        """Wrap a prebuilt CSR adjacency; the arrays may be read-only memory-mapped views"""
+        self.interaction_lookup = interaction_lookup
+        self.ids = tuple(ids.tolist())
+        self.positions = {ing: pos for pos, ing in enumerate(self.ids)}
+        self.indptr = indptr
+        self.indices = indices
+
+        # Per-ingredient neighbor sets for fast intersection with a routine
+        bounds = indptr.tolist()
+        neighbor_positions = indices.tolist()
+        self._neighbors: Tuple[FrozenSet[int], ...] = tuple(
+            frozenset(neighbor_positions[bounds[pos]:bounds[pos + 1]]) for pos in range(len(self.ids))
+        )
+
+    @classmethod
+    def build(cls, interaction_lookup: Mapping[Tuple[int, int], Dict]) -> "InteractionIndex":
+        """Build the adjacency from the (a_id, b_id) -> interaction lookup"""
+        # Compact ids: only ingredients that take part in at least one interaction
+        ids = sorted({int(ing) for pair in interaction_lookup for ing in pair})
+        positions = {ing: pos for pos, ing in enumerate(ids)}
+
+        adjacency: List[List[int]] = [[] for _ in ids]
+        for ing_a, ing_b in interaction_lookup:
+            if ing_a == ing_b:
+                continue  # An ingredient is never compared with itself
+            pos_a, pos_b = positions[int(ing_a)], positions[int(ing_b)]
+            adjacency[pos_a].append(pos_b)
+            adjacency[pos_b].append(pos_a)
+
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(neighbors) for neighbors in adjacency])
+        indices = np.fromiter(
+            (pos for neighbors in adjacency for pos in sorted(neighbors)),
+            dtype=np.int32,
+            count=int(indptr[-1]),
+        )
+        return cls(interaction_lookup, np.array(ids, dtype=np.int64), indptr, indices)
+
+    @classmethod
+    def from_arrays(cls, interaction_lookup: Mapping[Tuple[int, int], Dict], arrays: Mapping[str, np.ndarray]) -> "InteractionIndex":
+        return cls(interaction_lookup, *(arrays[name] for name in cls.ARRAYS))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """The arrays to store in a compiled snapshot, in from_arrays() form"""
+        return {"ids": np.array(self.ids, dtype=np.int64), "indptr": self.indptr, "indices": self.indices}
+
+    def neighbors(self, ingredient_id: int) -> FrozenSet[int]:
+        """Ingredient IDs that have an interaction with the given ingredient"""
+        pos = self.positions.get(ingredient_id)
+        if pos is None:
+            return frozenset()
+        return frozenset(self.ids[n] for n in self._neighbors[pos])
+
+    def find_pairs(self, ingredient_ids: Sequence[int]) -> List[Tuple[int, int, Dict]]:
+        """Find interacting positions (i, j, interaction_data) with i < j, in (i, j) order.
+
+        Only ingredients that interact with something are considered, and each
+        one's neighbor set is intersected with the routine's unique ingredients,
+        so the cost follows the number of hits rather than len(ingredient_ids)**2.
+        """
+        occurrences: Dict[int, List[int]] = {}
+        for idx, ing in enumerate(ingredient_ids):
+            pos = self.positions.get(ing)
+            if pos is not None:
+                occurrences.setdefault(pos, []).append(idx)
+
+        present = set(occurrences)
+        hits = []
+        for pos, indexes_a in occurrences.items():
+            for partner in self._neighbors[pos] & present:
+                if partner < pos:
+                    continue  # Each unordered pair is expanded once
+                ing_a, ing_b = self.ids[pos], self.ids[partner]
+                interaction_data = self.interaction_lookup[(ing_a, ing_b)]
+                for i in indexes_a:
+                    for j in occurrences[partner]:
+                        hits.append((i, j, interaction_data) if i < j else (j, i, interaction_data))
+
+        hits.sort(key=lambda hit: (hit[0], hit[1]))
+        return hits
+
+    def find_pairs_between(self, ingredient_ids: Sequence[int], other_ids: Sequence[int]) -> List[Tuple[int, int, Dict]]:
+        """Find interacting positions (i, j, interaction_data) with i in ingredient_ids and j in other_ids.
+
+        Only the other side's neighbor sets are intersected with the first
+        side, so adding or removing a few ingredients costs O(len(other_ids))
+        set intersections plus one pass over ingredient_ids, never the
+        routine's pairs.
+        """
+        occurrences: Dict[int, List[int]] = {}
+        for idx, ing in enumerate(ingredient_ids):
+            pos = self.positions.get(ing)
+            if pos is not None:
+                occurrences.setdefault(pos, []).append(idx)
+
+        hits = []
+        for j, ing in enumerate(other_ids):
+            pos = self.positions.get(ing)
+            if pos is None:
+                continue
+            for partner in sorted(self._neighbors[pos].intersection(occurrences)):
+                ing_a, ing_b = sorted((ing, self.ids[partner]))
+                interaction_data = self.interaction_lookup[(ing_a, ing_b)]
+                hits.extend((i, j, interaction_data) for i in occurrences[partner])
+
+        return hits
@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+try:
+    import brotli
+except ImportError:  # Optional: prepared responses are still offered gzip-compressed
+    brotli = None
+
+
+def make_etag(payload: Any) -> str:
+    """Strong ETag for a JSON-serializable payload"""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+
+
+def etag_matches(request: Request, *etags: str) -> bool:
+    """Whether the request's If-None-Match header already covers one of these ETags"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") in etags for tag in candidates)
+
+
+def json_response_with_etag(request: Request, payload: Any, etag: str) -> Response:
+    """Serve a JSON payload with its ETag, or an empty 304 if the client already has it"""
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(payload, headers={"ETag": etag})
+
+
+def encode_json(payload: Any) -> bytes:
+    """Serialize a payload exactly as FastAPI's JSONResponse would"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _accepted_encodings(request: Request) -> set:
+    """Content codings the client accepts (q=0 means refused)"""
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.lower())
+    return accepted
+
+
+class PreparedJSON:
+    """A JSON body serialized once up front, served as raw bytes with a strong ETag
+
+    Bodies of at least MIN_COMPRESS_SIZE bytes are also offered br (when the
+    optional brotli package is installed) or gzip encoded, by Accept-Encoding.
+    Each variant is compressed on first request and kept, and gets its own
+    ETag, as a strong validator must differ between content codings.
+    """
+
+    MIN_COMPRESS_SIZE = 1024
+
+    def __init__(self, payload: Any, cache_control: Optional[str] = None):
+        self._prepare(encode_json(payload), cache_control)
+
+    @classmethod
+    def from_body(cls, body: bytes, cache_control: Optional[str] = None) -> "PreparedJSON":
+        """Wrap an already serialized JSON body"""
+        prepared = cls.__new__(cls)
+        prepared._prepare(body, cache_control)
+        return prepared
+
+    def _prepare(self, body: bytes, cache_control: Optional[str]):
+        self.body = body
+        self.digest = hashlib.sha1(body).hexdigest()
+        self.etag = f'"{self.digest}"'
+        self.cache_control = cache_control
+        self.encodings = ()
+        if len(body) >= self.MIN_COMPRESS_SIZE:
+            self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+        self._variants: Dict[str, bytes] = {}
+
+    def _variant_etag(self, encoding: str) -> str:
+        return f'"{self.digest}-{encoding}"'
+
+    def _variant(self, encoding: str) -> bytes:
+        variant = self._variants.get(encoding)
+        if variant is None:
+            if encoding == "br":
+                variant = brotli.compress(self.body)
+            else:
+                variant = gzip.compress(self.body, compresslevel=6, mtime=0)
+            self._variants[encoding] = variant
+        return variant
+
+    def response(self, request: Request) -> Response:
+        """The prepared body in the best accepted encoding, or an empty 304 if the client already has it"""
+        headers = {"ETag": self.etag}
+        if self.encodings:
+            headers["Vary"] = "Accept-Encoding"
+        if self.cache_control:
+            headers["Cache-Control"] = self.cache_control
+
+        accepted = _accepted_encodings(request) if self.encodings else set()
+        encoding = next((encoding for encoding in self.encodings if encoding in accepted), None)
+        if encoding is not None:
+            headers["ETag"] = self._variant_etag(encoding)
+
+        # Any representation the client holds is still current
+        if etag_matches(request, self.etag, *(self._variant_etag(encoding) for encoding in self.encodings)):
+            return Response(status_code=304, headers=headers)
+        if encoding is None:
+            return Response(content=self.body, media_type="application/json", headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(content=self._variant(encoding), media_type="application/json", headers=headers)
@@ -0,0 +1,273 @@
+import numpy as np
+from functools import cached_property
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+
+class ScoreMatrix:
+    """Dense ingredient x category score matrix with a boolean ingredient clash matrix
+
+    Products map to their ingredient rows as CSR (indptr, rows): only the
+    non-zeros of the product x ingredient incidence are stored.
+    """
+
+    # Arrays that make up a matrix, as stored in the compiled catalog snapshot
+    ARRAYS = ("categories", "ingredient_ids", "scores", "presence", "clash", "product_ids", "product_indptr", "product_rows")
+
+    def __init__(
+        self,
+        categories: np.ndarray,
+        ingredient_ids: np.ndarray,
+        scores: np.ndarray,
+        presence: np.ndarray,
+        clash: np.ndarray,
+        product_ids: np.ndarray,
+        product_indptr: np.ndarray,
+        product_rows: np.ndarray,
+    ):
+        """Wrap prebuilt arrays as-is; they may be read-only memory-mapped views"""
+        self.categories = tuple(categories.tolist())
+        self.category_positions = {category: col for col, category in enumerate(self.categories)}
+        self.ingredient_ids = tuple(ingredient_ids.tolist())
+        self.positions = {ing: pos for pos, ing in enumerate(self.ingredient_ids)}
+        self.product_ids = tuple(product_ids.tolist())
+        self.product_positions = {product_id: pos for pos, product_id in enumerate(self.product_ids)}
+
+        self.scores = scores
+        # 1.0 where the ingredient lists the category at all, even with a zero score
+        self.presence = presence
+        self.clash = clash
+        # Each product's sorted ingredient rows: product_rows[product_indptr[p]:product_indptr[p + 1]]
+        self.product_indptr = product_indptr
+        self.product_rows = product_rows
+
+    @classmethod
+    def build(
+        cls,
+        categories: Sequence[str],
+        category_scores: Mapping[int, Dict[str, float]],
+        interaction_lookup: Mapping[Tuple[int, int], Dict],
+        product_ingredients: Mapping[int, Sequence[int]],
+    ) -> "ScoreMatrix":
+        """Build the matrices from parsed category scores, interactions and product ingredients"""
+        # Columns follow scoring_labels.csv, then any category only found in ingredient data
+        columns = list(dict.fromkeys(categories))
+        for scores in category_scores.values():
+            columns.extend(category for category in scores if category not in columns)
+        category_positions = {category: col for col, category in enumerate(columns)}
+
+        ingredient_ids = sorted(category_scores)
+        positions = {ing: pos for pos, ing in enumerate(ingredient_ids)}
+
+        shape = (len(ingredient_ids), len(columns))
+        score_values = np.zeros(shape, dtype=np.float64)
+        presence = np.zeros(shape, dtype=np.float64)
+        for ing, scores in category_scores.items():
+            for category, value in scores.items():
+                pos, col = positions[ing], category_positions[category]
+                score_values[pos, col] = value
+                presence[pos, col] = 1.0
+
+        clash = np.zeros((len(ingredient_ids), len(ingredient_ids)), dtype=bool)
+        for (ing_a, ing_b), interaction in interaction_lookup.items():
+            interaction_type = interaction.get("interaction_type")
+            if not isinstance(interaction_type, str) or interaction_type.lower() != "clash":
+                continue
+            pos_a, pos_b = positions.get(ing_a), positions.get(ing_b)
+            if pos_a is not None and pos_b is not None and pos_a != pos_b:
+                clash[pos_a, pos_b] = clash[pos_b, pos_a] = True
+
+        product_ids = sorted(product_ingredients)
+        rows_by_product = [
+            sorted({positions[ing] for ing in product_ingredients[product_id] if ing in positions})
+            for product_id in product_ids
+        ]
+        product_indptr = np.zeros(len(product_ids) + 1, dtype=np.int64)
+        product_indptr[1:] = np.cumsum([len(rows) for rows in rows_by_product])
+        product_rows = np.fromiter(
+            (row for rows in rows_by_product for row in rows), dtype=np.int64, count=int(product_indptr[-1])
+        )
+
+        return cls(
+            np.array(columns, dtype=str),
+            np.array(ingredient_ids, dtype=np.int64),
+            score_values,
+            presence,
+            clash,
+            np.array(product_ids, dtype=np.int64),
+            product_indptr,
+            product_rows,
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray]) -> "ScoreMatrix":
+        return cls(**{name: arrays[name] for name in cls.ARRAYS})
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """The arrays to store in a compiled snapshot, in from_arrays() form"""
+        return {
+            "categories": np.array(self.categories, dtype=str),
+            "ingredient_ids": np.array(self.ingredient_ids, dtype=np.int64),
+            "scores": self.scores,
+            "presence": self.presence,
+            "clash": self.clash,
+            "product_ids": np.array(self.product_ids, dtype=np.int64),
+            "product_indptr": self.product_indptr,
+            "product_rows": self.product_rows,
+        }
+
+    def rows(self, ingredient_ids: Iterable[int]) -> np.ndarray:
+        """Unique matrix rows for the given ingredient IDs (unknown IDs are dropped)"""
+        return np.array(
+            sorted({self.positions[ing] for ing in ingredient_ids if ing in self.positions}),
+            dtype=np.intp,
+        )
+
+    def category_totals(self, rows: np.ndarray) -> np.ndarray:
+        """Summed category scores over the selected rows"""
+        return self.scores[rows].sum(axis=0)
+
+    def clash_penalties(self, rows: np.ndarray) -> np.ndarray:
+        """-1 per clashing pair for every category both ingredients contribute to"""
+        present = self.presence[rows]
+        clash = np.triu(self.clash[np.ix_(rows, rows)], k=1).astype(np.float64)
+        return -((clash @ present) * present).sum(axis=0)
+
+    def score_delta(self, base_rows: np.ndarray, added_rows: np.ndarray) -> np.ndarray:
+        """Change in category values (totals plus clash penalties) when added_rows join base_rows
+
+        The row sets must be disjoint. Only pairs touching an added row are
+        visited: O(k * n) for k added and n base rows.
+        """
+        present_base = self.presence[base_rows]
+        present_added = self.presence[added_rows]
+        cross = self.clash[np.ix_(added_rows, base_rows)].astype(np.float64)
+        within = np.triu(self.clash[np.ix_(added_rows, added_rows)], k=1).astype(np.float64)
+        penalties = -(((cross @ present_base) + (within @ present_added)) * present_added).sum(axis=0)
+        return self.category_totals(added_rows) + penalties
+
+    @cached_property
+    def clash_pairs(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Clashing row pairs (u < v) and the number of categories both ingredients contribute to"""
+        u, v = np.nonzero(np.triu(self.clash, k=1))
+        return u, v, (self.presence[u] * self.presence[v]).sum(axis=1).astype(np.float32)
+
+    @cached_property
+    def product_clash_pairs(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Each product's own clashing row pairs as CSR (indptr, u, v, shared categories), computed on first use"""
+        products = np.repeat(np.arange(len(self.product_ids)), np.diff(self.product_indptr))
+        _, _, products, u, v = self._members_and_clashes(products, self.product_rows)
+        indptr = np.zeros(len(self.product_ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(products, minlength=len(self.product_ids)))
+        return indptr, u, v, (self.presence[u] * self.presence[v]).sum(axis=1)
+
+    def candidate_gains(self, base_rows: np.ndarray, product_positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(total score gain, new clashing pairs) of adding each candidate product to base_rows
+
+        Only the ingredients a candidate adds count; its gain is what
+        score_delta() would sum to: their category totals minus clash
+        penalties against the base rows and among themselves. All candidates
+        are scored in one vectorized pass over their sparse rows: a
+        product's own clash pairs are precomputed, so per routine they are
+        only checked against the base rows.
+        """
+        outside = np.ones(len(self.ingredient_ids), dtype=bool)
+        outside[base_rows] = False
+        base_clash = self.clash[:, base_rows]
+        shared_with_base = self.presence @ self.presence[base_rows].T
+        # Per ingredient the routine lacks: score it brings, net of penalties against the base
+        row_gains = (self.scores.sum(axis=1) - (base_clash * shared_with_base).sum(axis=1)) * outside
+        row_clashes = base_clash.sum(axis=1) * outside
+
+        candidates = np.arange(len(product_positions))
+        counts, rows = _gather(self.product_indptr, self.product_rows, product_positions)
+        owner = np.repeat(candidates, counts)
+        gains = np.bincount(owner, weights=row_gains[rows], minlength=len(candidates))
+        clashes = np.bincount(owner, weights=row_clashes[rows], minlength=len(candidates))
+
+        # A product's own clash pairs stop counting once either ingredient is already in the routine
+        indptr, u, v, shared = self.product_clash_pairs
+        counts, pairs = _gather(indptr, np.arange(len(u)), product_positions)
+        owner = np.repeat(candidates, counts)
+        new = outside[u[pairs]] & outside[v[pairs]]
+        gains -= np.bincount(owner, weights=shared[pairs] * new, minlength=len(candidates))
+        clashes += np.bincount(owner, weights=new, minlength=len(candidates))
+        return gains, clashes
+
+    def to_category_dict(self, values: np.ndarray, mask: np.ndarray) -> Dict[str, float]:
+        """Convert a category vector into a {category: value} dict for the masked columns"""
+        return {self.categories[col]: float(values[col]) for col in np.flatnonzero(mask)}
+
+    def score(self, ingredient_ids: Iterable[int]) -> Dict[str, float]:
+        """Category scores with clash penalties applied, for every category the routine touches"""
+        rows = self.rows(ingredient_ids)
+        values = self.category_totals(rows) + self.clash_penalties(rows)
+        return self.to_category_dict(values, self.presence[rows].any(axis=0))
+
+    @cached_property
+    def clash_partners(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Each row's clashing rows above it as CSR (indptr, rows), from clash_pairs"""
+        u, v, _ = self.clash_pairs
+        indptr = np.zeros(len(self.ingredient_ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(u, minlength=len(self.ingredient_ids)))
+        return indptr, v.astype(np.intp)
+
+    def _members_and_clashes(self, groups: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Distinct (group, row) members, and the clash pairs (group, u < v) among each group's members
+
+        Both come out sorted by group.
+        """
+        # Distinct members, as sorted keys group * n_rows + row
+        n_rows = len(self.ingredient_ids)
+        keys = np.unique(groups * n_rows + rows)
+        member_groups, member_rows = np.divmod(keys, n_rows)
+
+        # Clash pairs (row, partner > row) whose partner is a member of the same group
+        counts, partners = _gather(*self.clash_partners, member_rows)
+        pair_groups = np.repeat(member_groups, counts)
+        pair_rows = np.repeat(member_rows, counts)
+        partner_keys = pair_groups * n_rows + partners
+        found = np.searchsorted(keys, partner_keys)
+        found = keys[np.minimum(found, len(keys) - 1)] == partner_keys if len(keys) else found.astype(bool)
+        return member_groups, member_rows, pair_groups[found], pair_rows[found], partners[found]
+
+    def score_batch(self, routines: Sequence[Sequence[int]]) -> List[Dict[str, float]]:
+        """Score many routines (lists of product IDs) in one vectorized pass
+
+        Routines are kept as sparse (routine, row) membership entries, and
+        only the clash pairs among each routine's own rows are visited, so the
+        cost follows the routines' sizes rather than the catalog's.
+        """
+        entries = [
+            (r, self.product_positions[pid])
+            for r, product_ids in enumerate(routines)
+            for pid in product_ids
+            if pid in self.product_positions
+        ]
+        entries = np.array(entries, dtype=np.intp).reshape(-1, 2)
+        routine_idx, positions = entries[:, 0], entries[:, 1]
+
+        counts, rows = _gather(self.product_indptr, self.product_rows, positions)
+        member_routines, member_rows, pair_routines, u, v = self._members_and_clashes(np.repeat(routine_idx, counts), rows)
+
+        totals = _sum_by_routine(self.scores[member_rows], member_routines, len(routines))
+        touched = _sum_by_routine(self.presence[member_rows], member_routines, len(routines)) > 0
+        penalties = -_sum_by_routine(self.presence[u] * self.presence[v], pair_routines, len(routines))
+
+        values = totals + penalties
+        return [self.to_category_dict(values[r], touched[r]) for r in range(len(routines))]
+
+
+def _gather(indptr: np.ndarray, values: np.ndarray, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(segment lengths, concatenated segments) of a CSR structure for the given positions"""
+    starts, counts = indptr[positions], indptr[positions + 1] - indptr[positions]
+    # Index of each gathered value: its segment's start plus its offset within the segment
+    offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    return counts, values[np.repeat(starts, counts) + offsets]
+
+
+def _sum_by_routine(values: np.ndarray, routine_idx: np.ndarray, n_routines: int) -> np.ndarray:
+    """Per-routine column sums of values rows, each belonging to routine_idx"""
+    sums = np.zeros((n_routines, values.shape[1]))
+    for col in range(values.shape[1]):
+        sums[:, col] = np.bincount(routine_idx, weights=values[:, col], minlength=n_routines)
+    return sums
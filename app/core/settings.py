@@ -0,0 +1,28 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Settings:
+    """Runtime settings read from environment variables (or a .env file)"""
+
+    def __init__(self):
+        # Routine storage backend: "json" (default), "journal" or "sqlite"
+        self.routine_storage = os.getenv("ROUTINE_STORAGE", "json")
+        self.routine_db_path = os.getenv("ROUTINE_DB_PATH", "storage/routines.db")
+        # Seconds between checks of the catalog CSVs for changes (0 disables watching)
+        self.catalog_watch_interval = float(os.getenv("CATALOG_WATCH_INTERVAL", "0"))
+        # Bearer token required by /api/admin endpoints (unset disables them)
+        self.admin_token = os.getenv("ADMIN_TOKEN") or None
+        # Analysis worker pools: threads for small tasks, processes for ones of at least
+        # ANALYSIS_PROCESS_THRESHOLD products/routines (0 processes keeps everything on threads)
+        self.analysis_threads = int(os.getenv("ANALYSIS_THREADS", "4"))
+        self.analysis_processes = int(os.getenv("ANALYSIS_PROCESSES", "2"))
+        self.analysis_process_threshold = int(os.getenv("ANALYSIS_PROCESS_THRESHOLD", "50"))
+        # Tasks admitted per pool (running + queued) before requests are rejected with 503
+        self.analysis_max_pending = int(os.getenv("ANALYSIS_MAX_PENDING", "64"))
+
+
+# Global settings instance
+settings = Settings()
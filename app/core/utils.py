@@ -1,9 +1,18 @@
-from typing import Tuple
+import hashlib
+from typing import Iterable, Optional, Tuple
 
 def get_ordered_pair(id1: int, id2: int) -> Tuple[int, int]:
     """Get ordered pair for consistent interaction lookup"""
     return (id1, id2) if id1 < id2 else (id2, id1)
 
+def routine_fingerprint(product_ids: Iterable[int], ordered: bool = False, treatment_id: Optional[int] = None) -> str:
+    """Canonical hash of a routine's product IDs (sorted unless order matters)"""
+    ids = list(product_ids) if ordered else sorted(product_ids)
+    key = ",".join(str(pid) for pid in ids)
+    if treatment_id is not None:
+        key += f"|treatment={treatment_id}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
 def truncate_text(text: str, max_length: int = 50) -> str:
     """Truncate text with ellipsis"""
     return text if len(text) <= max_length else text[:max_length-3] + "..."
@@ -5,6 +5,10 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.routers import api_router
 from app.core.db import data_manager
+from app.core.settings import settings
+from app.services.analysis_pool import analysis_pool
+from app.services.skincare_analyzer import analyzer
+from app.services.storage_service import routine_storage
 
 def create_app() -> FastAPI:
     """Application factory"""
@@ -28,16 +32,39 @@ def create_app() -> FastAPI:
     # Include routers
     app.include_router(api_router, prefix="/api", tags=["api"])
 
+    # Pick up catalog CSV changes without a restart, if enabled
+    @app.on_event("startup")
+    async def start_catalog_watcher():
+        data_manager.start_watching(settings.catalog_watch_interval)
+
+    # Spawn the analysis worker processes before the first large request needs them
+    @app.on_event("startup")
+    async def start_analysis_pool():
+        analysis_pool.start()
+
+    @app.on_event("shutdown")
+    async def stop_analysis_pool():
+        analysis_pool.shutdown()
+
+    # Stores batch their fsyncs; flush what is pending before the process exits
+    @app.on_event("shutdown")
+    async def close_routine_storage():
+        routine_storage.close()
+
     # Health check endpoint
     @app.get("/health")
     async def health_check():
         """Health check endpoint"""
+        catalog = data_manager.snapshot
         return {
             "status": "healthy",
-            "data_loaded": not data_manager.ingredients.empty,
-            "total_ingredients": len(data_manager.ingredients),
-            "total_products": len(data_manager.products),
-            "total_interactions": len(data_manager.interactions)
+            "data_loaded": not catalog.ingredients.empty,
+            "total_ingredients": len(catalog.ingredients),
+            "total_products": len(catalog.products),
+            "total_interactions": len(catalog.interactions),
+            "catalog": {"version": catalog.version, **data_manager.reload_stats},
+            "analysis_cache": analyzer.cache.stats(),
+            "analysis_pool": analysis_pool.stats()
         }
 
     return app
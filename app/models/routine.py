@@ -1,7 +1,8 @@
-from typing import Dict, Optional, List
+from typing import Any, Dict, Optional, List
 from pydantic import BaseModel, Field, computed_field
 
 from app.models.product import ProductInfo
+from app.models.treatment import TreatmentAnalysis
 
 class RoutineItem(ProductInfo):
     """Extended product info with routine-specific metadata"""
@@ -69,6 +70,51 @@ class PreviewRoutineResponse(BaseModel):
     total_products: int
 
 
+class BatchScoreRequest(BaseModel):
+    """Request model for scoring many candidate routines in one call"""
+    routines: List[List[int]] = Field(..., min_items=1, max_items=10000, description="Product IDs of each candidate routine")
+
+
+class CustomIngredientGroup(BaseModel):
+    """Ingredients not in a catalog product, analyzed as one source"""
+    ingredient_names: List[str] = Field(..., min_items=1, description="Ingredient names, common names or IDs")
+    label: Optional[str] = Field(None, description="Source label in results (default Custom_<n>)")
+
+
+class AdHocAnalysisRequest(BaseModel):
+    """An unsaved routine to analyze: catalog products plus optional custom ingredients"""
+    product_ids: List[int] = Field(default_factory=list, description="Product IDs, in routine order")
+    custom_ingredients: List[CustomIngredientGroup] = Field(default_factory=list)
+
+
+class BulkUpdateRoutineItem(UpdateRoutineRequest):
+    """One routine update in a bulk request"""
+    routine_id: str
+
+
+class BulkRoutinesRequest(BaseModel):
+    """Request model for bulk create/update
+
+    Items are validated one by one (as CreateRoutineRequest or
+    BulkUpdateRoutineItem), so an invalid item is reported in its result
+    instead of rejecting the whole request.
+    """
+    routines: List[Dict[str, Any]] = Field(..., min_items=1, max_items=10000)
+
+
+class BulkRoutineResult(BaseModel):
+    index: int  # Position in the request
+    status: int  # HTTP status this item would have had on its own: 201, 200, 400, 404 or 422
+    routine_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BulkRoutineResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkRoutineResult]
+
+
 class ScoreResult(BaseModel):
     category_scores: Dict[str, float]
     total_score: float
@@ -84,3 +130,44 @@ class InteractionResult(BaseModel):
     interaction_type: str
     effect: str
     details: str
+
+
+class RoutineAnalysis(BaseModel):
+    """Several analyses of one routine in a single body; parts not asked for are left out"""
+    interactions: Optional[List[InteractionResult]] = None
+    score: Optional[ScoreResult] = None
+    post_treatment: Optional[Dict[int, TreatmentAnalysis]] = None
+
+
+class RoutineDeltaRequest(BaseModel):
+    """One product to add to or remove from a stored routine"""
+    action: str = Field(..., pattern="^(add|remove)$")
+    product_id: int
+
+
+class RoutineDelta(BaseModel):
+    """How a routine's analysis changes when one product is added or removed"""
+    action: str
+    product_id: int
+    added_interactions: List[InteractionResult]
+    removed_interactions: List[InteractionResult]
+    category_deltas: Dict[str, float]
+    total_score_delta: float
+    score: ScoreResult  # After the change
+
+
+class ProductRecommendation(BaseModel):
+    product_id: int
+    brand_name: str
+    product_name: str
+    product_type: str
+    score_gain: float
+    new_clashes: int
+    rank_score: float  # score_gain - clash_penalty * new_clashes
+    category_deltas: Dict[str, float]
+
+
+class ProductRecommendations(BaseModel):
+    """Best products to add to a routine, out of every catalog candidate considered"""
+    candidates: int
+    recommendations: List[ProductRecommendation]
@@ -0,0 +1,34 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.db import data_manager
+from app.core.settings import settings
+
+
+def require_admin_token(authorization: Optional[str] = Header(None)):
+    """Admit only requests bearing settings.admin_token; without one configured the endpoints are off"""
+    if settings.admin_token is None:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+@router.post("/reload")
+async def reload_catalog():
+    """Rebuild the catalog from the CSV files and swap it in without blocking requests"""
+    # Built on a worker thread; requests keep using the current snapshot until the swap
+    reloaded = await run_in_threadpool(data_manager.load_data)
+    if not reloaded:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Reload failed, keeping catalog version {data_manager.snapshot.version}: "
+                   f"{data_manager.reload_stats['last_reload_error']}"
+        )
+    
+    return {"version": data_manager.snapshot.version, **data_manager.reload_stats}
@@ -0,0 +1,101 @@
+from fastapi import APIRouter, HTTPException
+from typing import Any, Callable, List, Tuple
+import logging
+
+from app.core.db import data_manager
+from app.models.routine import AdHocAnalysisRequest, InteractionResult, RoutineAnalysis, ScoreResult
+from app.models.treatment import TreatmentAnalysis
+from app.services import analysis_pool as analysis_tasks
+from app.services.analysis_pool import PoolUnavailable, analysis_pool
+from app.services.skincare_analyzer import CustomIngredients
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/analyze", tags=["analysis"])
+
+
+async def run_analysis(size: int, task: Callable[..., Any], *args: Any) -> Any:
+    """Run CPU-bound work on the analysis pool; a saturated or broken pool answers 503"""
+    try:
+        return await analysis_pool.run(size, task, *args)
+    except PoolUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
+def _resolve_custom(request: AdHocAnalysisRequest) -> CustomIngredients:
+    """Resolve custom ingredient names (or IDs) to (label, ingredient_ids) groups"""
+    custom, unknown = [], []
+    for idx, group in enumerate(request.custom_ingredients):
+        ingredient_ids = []
+        for name in group.ingredient_names:
+            ing_id = data_manager.resolve_ingredient(name)
+            if ing_id is not None:
+                ingredient_ids.append(ing_id)
+            else:
+                unknown.append(name.strip())
+        custom.append((group.label or f"Custom_{idx + 1}", tuple(ingredient_ids)))
+    
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown ingredients: {unknown}")
+    return tuple(custom)
+
+
+async def _analyze(
+    request: AdHocAnalysisRequest, interactions: bool = False, score: bool = False, treatment_ids: Tuple[int, ...] = ()
+) -> RoutineAnalysis:
+    """Validate an ad-hoc routine and analyze it on the pool; nothing is read from or written to storage"""
+    if not request.product_ids and not request.custom_ingredients:
+        raise HTTPException(status_code=400, detail="Nothing to analyze: give product_ids and/or custom_ingredients")
+    
+    invalid_ids = [pid for pid in request.product_ids if pid not in data_manager.product_index]
+    if invalid_ids:
+        raise HTTPException(status_code=400, detail=f"Invalid product IDs: {invalid_ids}")
+    custom = _resolve_custom(request)
+    
+    return await run_analysis(
+        len(request.product_ids) + len(custom), analysis_tasks.analyze_ad_hoc,
+        request.product_ids, custom, interactions, score, treatment_ids
+    )
+
+
+@router.post("/interactions", response_model=List[InteractionResult])
+async def analyze_interactions(request: AdHocAnalysisRequest):
+    """Analyze ingredient interactions of an unsaved routine"""
+    try:
+        return (await _analyze(request, interactions=True)).interactions
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error analyzing interactions: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/score", response_model=ScoreResult)
+async def analyze_score(request: AdHocAnalysisRequest):
+    """Calculate category scores of an unsaved routine"""
+    try:
+        return (await _analyze(request, score=True)).score
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error calculating scores: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/post-treatment/{treatment_id}", response_model=TreatmentAnalysis)
+async def analyze_post_treatment(treatment_id: int, request: AdHocAnalysisRequest):
+    """Analyze the safety of an unsaved routine after a treatment"""
+    try:
+        if not data_manager.get_treatment_rules(treatment_id):
+            raise HTTPException(status_code=404, detail="No rules found for this treatment")
+        
+        return (await _analyze(request, treatment_ids=(treatment_id,))).post_treatment[treatment_id]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error analyzing post-treatment: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,15 +1,19 @@
 from fastapi import APIRouter
 from .routines import router as routine_router
+from .analysis import router as analysis_router
 from .ingredients import router as ingredients_router
 from .products import router as products_router
 from .treatments import router as treatments_router
 from .config import router as config_router
+from .admin import router as admin_router
 
 # Create main API router
 router = APIRouter()
 
 router.include_router(routine_router)
+router.include_router(analysis_router)
 router.include_router(ingredients_router)
 router.include_router(products_router)
 router.include_router(treatments_router)
-router.include_router(config_router) 
\ No newline at end of file
+router.include_router(config_router)
+router.include_router(admin_router) 
\ No newline at end of file
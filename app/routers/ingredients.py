@@ -1,19 +1,21 @@
 from typing import List
-from fastapi import HTTPException, APIRouter
-from app.core.db import data_manager
+from fastapi import HTTPException, APIRouter, Request
+from app.core.catalog_responses import catalog_responses
 from app.models.ingredient import IngredientInfo
 
 router = APIRouter(prefix="/ingredients", tags=["ingredients"])
 
 @router.get("", response_model=List[IngredientInfo])
-async def get_all_ingredients():
-    """Get all ingredients"""
-    return data_manager.get_all_ingredients()
+async def get_all_ingredients(request: Request):
+    """Get all ingredients (pre-serialized per catalog version)"""
+    responses = await catalog_responses.get_async()
+    return responses.ingredients.response(request)
 
 @router.get("/{ingredient_id}", response_model=IngredientInfo)
-async def get_ingredient(ingredient_id: int):
+async def get_ingredient(ingredient_id: int, request: Request):
     """Get specific ingredient by ID"""
-    ingredient = data_manager.get_ingredient_by_id(ingredient_id)
+    responses = await catalog_responses.get_async()
+    ingredient = responses.ingredient_by_id.get(ingredient_id)
     if not ingredient:
         raise HTTPException(status_code=404, detail="Ingredient not found")
-    return ingredient
\ No newline at end of file
+    return ingredient.response(request)
\ No newline at end of file
@@ -1,20 +1,60 @@
-from typing import List
-from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
 
+from app.core.catalog_responses import catalog_responses
 from app.core.db import data_manager
 from app.models.product import ProductInfo
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+def _resolve_ingredients(names: Optional[str]) -> List[int]:
+    """Resolve a comma-separated list of ingredient names (or IDs) to ingredient IDs"""
+    ingredient_ids, unknown = [], []
+    for name in (names or "").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        ing_id = data_manager.resolve_ingredient(name)
+        if ing_id is not None:
+            ingredient_ids.append(ing_id)
+        else:
+            unknown.append(name)
+    
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown ingredients: {unknown}")
+    return ingredient_ids
+
 @router.get("", response_model=List[ProductInfo])
-async def get_all_products():
-    """Get all products"""
-    return data_manager.get_all_products()
+async def get_all_products(
+    request: Request,
+    contains: Optional[str] = Query(None, description="Comma-separated ingredients (names or IDs) every product must contain"),
+    excludes: Optional[str] = Query(None, description="Comma-separated ingredients (names or IDs) no product may contain"),
+    free_of_treatment: Optional[int] = Query(None, description="Also exclude every ingredient this treatment's rules flag"),
+):
+    """Get all products (pre-serialized per catalog version), optionally filtered by ingredients
+    
+    Filters are answered from the ingredient -> products index by set
+    intersection and difference; matches are listed by product ID.
+    """
+    responses = await catalog_responses.get_async()
+    if contains is None and excludes is None and free_of_treatment is None:
+        return responses.products.response(request)
+    
+    excluded = _resolve_ingredients(excludes)
+    if free_of_treatment is not None:
+        flagged = data_manager.get_treatment_ingredient_ids(free_of_treatment)
+        if not flagged:
+            raise HTTPException(status_code=404, detail="No rules found for this treatment")
+        excluded.extend(flagged)
+    
+    product_ids = data_manager.find_product_ids(_resolve_ingredients(contains), excluded)
+    return responses.product_list(product_ids).response(request)
 
 @router.get("/{product_id}", response_model=ProductInfo)
-async def get_product(product_id: int):
+async def get_product(product_id: int, request: Request):
     """Get specific product by ID"""
-    product = data_manager.get_product_by_id(product_id)
+    responses = await catalog_responses.get_async()
+    product = responses.product_by_id.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
\ No newline at end of file
+    return product.response(request)
@@ -1,28 +1,156 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+import base64
+import json
 import logging
-from typing import List
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, TypeVar
+
+from pydantic import ValidationError
 
 from app.models.routine import (
+    BatchScoreRequest,
+    BulkRoutineResponse,
+    BulkRoutineResult,
+    BulkRoutinesRequest,
+    BulkUpdateRoutineItem,
     CreateRoutineRequest,
     InteractionResult,
+    ProductRecommendations,
+    RoutineAnalysis,
+    RoutineDelta,
+    RoutineDeltaRequest,
     RoutineItem,
     RoutineResponse,
     ScoreResult,
     UpdateRoutineRequest, 
 )
 from app.core.db import data_manager
-from app.services.skincare_analyzer import analyzer
+from app.core.responses import json_response_with_etag, make_etag
 from app.models.treatment import TreatmentAnalysis
+from app.routers.analysis import run_analysis
+from app.services import analysis_pool as analysis_tasks
 from app.services.routine_service import RoutineService
 from app.services.storage_service import routine_storage
 
 
 logger = logging.getLogger(__name__)
 
+BulkItem = TypeVar("BulkItem", CreateRoutineRequest, BulkUpdateRoutineItem)
+
 router = APIRouter(prefix="/routines", tags=["routines"])
 routine_service = RoutineService()
 
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+LISTABLE_FIELDS = set(RoutineResponse.model_fields)
+ANALYSIS_PARTS = ("interactions", "score")
+TREATMENT_PREFIX = "treatment:"
+
+
+def _encode_cursor(routine: Dict) -> str:
+    """Opaque pagination cursor for the position right after this routine"""
+    position = json.dumps([routine.get('created_at', ''), routine.get('routine_id', '')])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, routine_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), str(routine_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a comma-separated field projection"""
+    if not fields:
+        return None
+    projection = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in projection if field not in LISTABLE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {unknown}")
+    return projection
+
+
+def _project(routine: Dict, projection: Optional[List[str]]) -> Dict:
+    """Apply a field projection; persisted analysis results are never listed"""
+    if projection is None:
+        return {key: value for key, value in routine.items() if key != "analysis"}
+    return {field: routine.get(field) for field in projection}
+
+
+def _parse_include(include: str) -> Tuple[Set[str], List[int]]:
+    """Parse include=interactions,score,treatment:1,2 into (parts, treatment IDs)
+
+    Bare IDs after a treatment: entry continue its list of treatment IDs.
+    """
+    parts: Set[str] = set()
+    treatment_ids: List[int] = []
+    in_treatments = False
+    for token in (token.strip() for token in include.split(",")):
+        if not token:
+            continue
+        if token in ANALYSIS_PARTS:
+            parts.add(token)
+            in_treatments = False
+            continue
+        if token.startswith(TREATMENT_PREFIX):
+            token = token[len(TREATMENT_PREFIX):]
+            in_treatments = True
+        elif not in_treatments:
+            raise HTTPException(status_code=400, detail=f"Unknown analysis: {token}")
+        try:
+            treatment_id = int(token)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid treatment ID: {token}")
+        if treatment_id not in treatment_ids:
+            treatment_ids.append(treatment_id)
+    if not parts and not treatment_ids:
+        raise HTTPException(status_code=400, detail="Nothing to include")
+    return parts, treatment_ids
+
+
+def _analysis_source(stored_routine: Dict) -> Dict:
+    """What an analysis of the routine is computed from: the catalog contents and the routine's products"""
+    return {"catalog": data_manager.snapshot.fingerprint, "product_ids": stored_routine.get('product_ids', [])}
+
+
+def _stored_analyses(stored_routine: Dict, kinds: List[str], source: Dict) -> Dict[str, Dict]:
+    """Stored analyses of the given kinds that are still valid for source; stale ones count as missing"""
+    stored = stored_routine.get('analysis', {})
+    return {
+        kind: stored[kind] for kind in kinds
+        if kind in stored and all(stored[kind].get(key) == value for key, value in source.items())
+    }
+
+
+async def _serve_analysis(
+    request: Request,
+    routine_id: str,
+    stored_routine: Dict,
+    kind: str,
+    task: Callable[..., Any],
+    *args: Any,
+) -> Response:
+    """Serve the analysis stored with a routine, computing task(*args, steps) and persisting it on first use"""
+    # Taken before computing: a reload meanwhile only makes the result look stale, never fresh
+    source = _analysis_source(stored_routine)
+    analysis = _stored_analyses(stored_routine, [kind], source).get(kind)
+    if analysis is None:
+        # Convert stored items to RoutineItem objects for analyzer
+        routine_steps = [RoutineItem(**item) for item in stored_routine.get('items', [])]
+        body = jsonable_encoder(await run_analysis(len(routine_steps), task, *args, routine_steps))
+        analysis = {"etag": make_etag(body), "body": body, **source}
+        # Only attached if the routine's products are still the ones it was computed from
+        await run_in_threadpool(routine_storage.save_analysis, routine_id, kind, analysis, stored_routine)
+    
+    return json_response_with_etag(request, analysis["body"], analysis["etag"])
+
+
 @router.post("", response_model=RoutineResponse)
 async def create_routine(request: CreateRoutineRequest):
     """Create a new skincare routine with ordered steps"""
@@ -43,7 +171,8 @@ async def create_routine(request: CreateRoutineRequest):
         
         # Order the products into steps
         time_of_day = request.time_of_day or "both"  # Default to "both" if not specified
-        ordered_steps = routine_service.order_routine_products(
+        ordered_steps = await run_analysis(
+            len(request.product_ids), analysis_tasks.order_routine_products,
             request.product_ids, 
             time_of_day
         )
@@ -59,11 +188,12 @@ async def create_routine(request: CreateRoutineRequest):
         }
         
         # Store the routine
-        routine_id = routine_storage.create_routine(routine_data)
+        # Writes wait for a durable flush; do that off the event loop
+        routine_id = await run_in_threadpool(routine_storage.create_routine, routine_data)
         logger.info(f"Routine created with ID: {routine_id}")
         
         # Get and return the stored routine
-        stored_routine = routine_storage.get_routine(routine_id)
+        stored_routine = await run_in_threadpool(routine_storage.get_routine, routine_id)
         return RoutineResponse(**stored_routine)
         
     except HTTPException:
@@ -74,12 +204,39 @@ async def create_routine(request: CreateRoutineRequest):
 
 
 @router.get("")
-async def list_routines():
-    """List all routines"""
+async def list_routines(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size (default 100; unlimited for ndjson)"),
+    after: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    user_id: Optional[str] = Query(None),
+    time_of_day: Optional[str] = Query(None),
+    product_id: Optional[int] = Query(None, description="Only routines containing this product"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. routine_id,name"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams one routine per line"),
+):
+    """List routines, paginated by cursor and optionally filtered and projected"""
+    projection = _parse_fields(fields)
+    routines = routine_storage.iter_routines(
+        user_id=user_id,
+        time_of_day=time_of_day,
+        after=_decode_cursor(after) if after else None,
+        product_id=product_id,
+    )
+    
+    if format == "ndjson":
+        if limit is not None:
+            routines = islice(routines, limit)
+        lines = (json.dumps(_project(routine, projection), default=str) + "\n" for routine in routines)
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+    
     try:
-        routines = routine_storage.list_routines()
+        page_size = limit or DEFAULT_PAGE_SIZE
+        # Store reads (SQLite queries) run off the event loop
+        page = await run_in_threadpool(lambda: list(islice(routines, page_size + 1)))
+        has_more = len(page) > page_size
+        page = page[:page_size]
         return {
-            "routines": routines,
+            "routines": [_project(routine, projection) for routine in page],
+            "next_cursor": _encode_cursor(page[-1]) if has_more else None,
         }
         
     except Exception as e:
@@ -89,7 +246,7 @@ async def list_routines():
 @router.get("/{routine_id}", response_model=RoutineResponse)
 async def get_routine(routine_id: str):
     """Get a routine by ID"""
-    stored_routine = routine_storage.get_routine(routine_id)
+    stored_routine = await run_in_threadpool(routine_storage.get_routine, routine_id)
     if not stored_routine:
         raise HTTPException(status_code=404, detail="Routine not found")
 
@@ -101,7 +258,7 @@ async def update_routine(routine_id: str, request: UpdateRoutineRequest):
     """Update a routine and re-order if products changed"""
     try:
         # Check if routine exists
-        existing_routine = routine_storage.get_routine(routine_id)
+        existing_routine = await run_in_threadpool(routine_storage.get_routine, routine_id)
         if not existing_routine:
             raise HTTPException(status_code=404, detail="Routine not found")
         
@@ -119,7 +276,8 @@ async def update_routine(routine_id: str, request: UpdateRoutineRequest):
             
             # Re-order with new products
             time_of_day = request.time_of_day or existing_routine.get('time_of_day', 'both')
-            ordered_steps = routine_service.order_routine_products(
+            ordered_steps = await run_analysis(
+                len(request.product_ids), analysis_tasks.order_routine_products,
                 request.product_ids,
                 time_of_day
             )
@@ -138,19 +296,20 @@ async def update_routine(routine_id: str, request: UpdateRoutineRequest):
             # If only time_of_day changed but not products, might need to re-order
             # (depending on if your ordering logic uses time_of_day)
             if 'product_ids' not in update_data:
-                ordered_steps = routine_service.order_routine_products(
+                ordered_steps = await run_analysis(
+                    len(existing_routine['product_ids']), analysis_tasks.order_routine_products,
                     existing_routine['product_ids'],
                     request.time_of_day
                 )
                 update_data['items'] = [step.dict() for step in ordered_steps]
         
         # Update the routine
-        success = routine_storage.update_routine(routine_id, update_data)
+        success = await run_in_threadpool(routine_storage.update_routine, routine_id, update_data)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to update routine")
         
         # Return updated routine
-        updated_routine = routine_storage.get_routine(routine_id)
+        updated_routine = await run_in_threadpool(routine_storage.get_routine, routine_id)
         return RoutineResponse(**updated_routine)
         
     except HTTPException:
@@ -164,7 +323,7 @@ async def update_routine(routine_id: str, request: UpdateRoutineRequest):
 async def delete_routine(routine_id: str):
     """Delete a routine"""
     try:
-        success = routine_storage.delete_routine(routine_id)
+        success = await run_in_threadpool(routine_storage.delete_routine, routine_id)
         
         if not success:
             raise HTTPException(status_code=404, detail="Routine not found")
@@ -182,8 +341,7 @@ async def preview_routine_order(request: CreateRoutineRequest):
     """Preview routine order without storing it"""
     try:
         # Validate product IDs
-        existing_product_ids = set(data_manager.products["product_id"].tolist())
-        invalid_ids = [pid for pid in request.product_ids if pid not in existing_product_ids]
+        invalid_ids = [pid for pid in request.product_ids if pid not in data_manager.product_index]
         
         if invalid_ids:
             raise HTTPException(
@@ -192,28 +350,232 @@ async def preview_routine_order(request: CreateRoutineRequest):
             )
         
         # Order the products
-        ordered_routine = routine_service.order_routine_products(
+        ordered_routine = await run_analysis(
+            len(request.product_ids), analysis_tasks.order_routine_products,
             request.product_ids, 
             request.time_of_day
         )
         
         return ordered_routine
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error previewing routine: {str(e)}")
 
+def _validate_bulk_items(
+    raw_items: List[Dict[str, Any]], model: Type[BulkItem], results: List[Optional[BulkRoutineResult]]
+) -> List[Tuple[int, BulkItem]]:
+    """Validate each bulk item on its own, recording a 422 result for the ones that fail"""
+    accepted = []
+    for index, raw in enumerate(raw_items):
+        try:
+            accepted.append((index, model.model_validate(raw)))
+        except ValidationError as e:
+            results[index] = BulkRoutineResult(index=index, status=422, error=str(e))
+    return accepted
+
+
+def _unknown_product_ids(items: List[Tuple[int, Any]]) -> Set[int]:
+    """Catalog check for a whole bulk request in one pass over its distinct product IDs"""
+    product_index = data_manager.product_index
+    requested = {pid for _, item in items if item.product_ids for pid in item.product_ids}
+    return {pid for pid in requested if pid not in product_index}
+
+
+def _bulk_response(results: List[BulkRoutineResult]) -> BulkRoutineResponse:
+    failed = sum(1 for result in results if result.status >= 400)
+    return BulkRoutineResponse(succeeded=len(results) - failed, failed=failed, results=results)
+
+
+@router.post(":bulk", response_model=BulkRoutineResponse)
+async def create_routines_bulk(request: BulkRoutinesRequest):
+    """Create many routines: validated and ordered together, then stored in one transaction"""
+    try:
+        results: List[Optional[BulkRoutineResult]] = [None] * len(request.routines)
+        accepted = _validate_bulk_items(request.routines, CreateRoutineRequest, results)
+        
+        unknown = _unknown_product_ids(accepted)
+        valid = []
+        for index, item in accepted:
+            invalid_ids = [pid for pid in item.product_ids if pid in unknown]
+            if invalid_ids:
+                results[index] = BulkRoutineResult(index=index, status=400, error=f"Invalid product IDs: {invalid_ids}")
+            else:
+                valid.append((index, item))
+        
+        ordered = await run_analysis(
+            len(valid), analysis_tasks.order_routines_bulk,
+            [(item.product_ids, item.time_of_day or "both") for _, item in valid]
+        )
+        routines = [
+            {
+                "name": item.name,
+                "description": item.description or "",
+                "product_ids": item.product_ids,
+                "time_of_day": item.time_of_day or "both",
+                "items": items,
+                "user_id": item.user_id
+            }
+            for (_, item), items in zip(valid, ordered)
+        ]
+        
+        routine_ids = await run_in_threadpool(routine_storage.create_routines, routines) if routines else []
+        for (index, _), routine_id in zip(valid, routine_ids):
+            results[index] = BulkRoutineResult(index=index, status=201, routine_id=routine_id)
+        logger.info(f"Bulk created {len(routine_ids)} of {len(results)} routines")
+        
+        return _bulk_response(results)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating routines in bulk: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.put(":bulk", response_model=BulkRoutineResponse)
+async def update_routines_bulk(request: BulkRoutinesRequest):
+    """Update many routines, re-ordering where products or time of day change, in one transaction"""
+    try:
+        results: List[Optional[BulkRoutineResult]] = [None] * len(request.routines)
+        accepted = _validate_bulk_items(request.routines, BulkUpdateRoutineItem, results)
+        
+        existing_routines = await run_in_threadpool(
+            lambda: [routine_storage.get_routine(item.routine_id) for _, item in accepted]
+        )
+        unknown = _unknown_product_ids(accepted)
+        valid, to_order = [], []
+        # Routine state as of the items so far, so repeats of a routine_id build on earlier ones
+        pending: Dict[str, Dict] = {}
+        for (index, item), existing in zip(accepted, existing_routines):
+            existing = pending.get(item.routine_id, existing)
+            if not existing:
+                results[index] = BulkRoutineResult(index=index, status=404, routine_id=item.routine_id, error="Routine not found")
+                continue
+            invalid_ids = [pid for pid in item.product_ids or [] if pid in unknown]
+            if invalid_ids:
+                results[index] = BulkRoutineResult(
+                    index=index, status=400, routine_id=item.routine_id, error=f"Invalid product IDs: {invalid_ids}"
+                )
+                continue
+            
+            valid.append((index, item))
+            pending[item.routine_id] = {
+                **existing, **item.model_dump(include={"product_ids", "time_of_day"}, exclude_none=True)
+            }
+            # Same rule as a single update: re-order when products or time of day change
+            if item.product_ids is not None or item.time_of_day is not None:
+                state = pending[item.routine_id]
+                to_order.append((state['product_ids'], state.get('time_of_day', 'both')))
+        
+        ordered = iter(await run_analysis(len(to_order), analysis_tasks.order_routines_bulk, to_order))
+        updates = []
+        for _, item in valid:
+            update_data = item.model_dump(include={"name", "description", "product_ids", "time_of_day"}, exclude_none=True)
+            if item.product_ids is not None or item.time_of_day is not None:
+                update_data['items'] = next(ordered)
+            updates.append((item.routine_id, update_data))
+        
+        found = await run_in_threadpool(routine_storage.update_routines, updates) if updates else []
+        for (index, item), updated in zip(valid, found):
+            if updated:
+                results[index] = BulkRoutineResult(index=index, status=200, routine_id=item.routine_id)
+            else:  # Deleted since it was read
+                results[index] = BulkRoutineResult(index=index, status=404, routine_id=item.routine_id, error="Routine not found")
+        
+        return _bulk_response(results)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating routines in bulk: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/analyze/score:batch", response_model=List[ScoreResult])
+async def analyze_score_batch(request: BatchScoreRequest):
+    """Calculate category scores for many candidate routines in one call"""
+    try:
+        invalid_ids = sorted({
+            pid for product_ids in request.routines for pid in product_ids
+            if pid not in data_manager.product_index
+        })
+        if invalid_ids:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid product IDs: {invalid_ids}"
+            )
+        
+        return await run_analysis(
+            len(request.routines), analysis_tasks.calculate_routine_scores_batch, request.routines
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error calculating batch scores: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{routine_id}/analysis", response_model=RoutineAnalysis, response_model_exclude_none=True)
+async def analyze_routine(
+    routine_id: str,
+    request: Request,
+    include: str = Query("interactions,score", description="e.g. interactions,score,treatment:1,2"),
+):
+    """Several analyses of a routine in one round trip, sharing one ingredient resolution"""
+    try:
+        parts, treatment_ids = _parse_include(include)
+        unknown_treatments = [tid for tid in treatment_ids if not data_manager.get_treatment_rules(tid)]
+        if unknown_treatments:
+            raise HTTPException(status_code=404, detail=f"No rules found for treatments: {unknown_treatments}")
+        
+        stored_routine = await run_in_threadpool(routine_storage.get_routine, routine_id)
+        if not stored_routine:
+            raise HTTPException(status_code=404, detail="Routine not found")
+        
+        # Same stored results as the single-analysis endpoints; only the missing or stale ones are computed
+        kinds = [part for part in ANALYSIS_PARTS if part in parts]
+        kinds += [f"post_treatment:{tid}" for tid in treatment_ids]
+        source = _analysis_source(stored_routine)
+        analyses = _stored_analyses(stored_routine, kinds, source)
+        missing = [kind for kind in kinds if kind not in analyses]
+        if missing:
+            routine_steps = [RoutineItem(**item) for item in stored_routine.get('items', [])]
+            missing_treatments = tuple(tid for tid in treatment_ids if f"post_treatment:{tid}" in missing)
+            computed = jsonable_encoder(await run_analysis(
+                len(routine_steps), analysis_tasks.analyze_routine,
+                "interactions" in missing, "score" in missing, missing_treatments, routine_steps
+            ))
+            bodies = {kind: computed[kind] for kind in ANALYSIS_PARTS if kind in missing}
+            bodies.update({f"post_treatment:{tid}": computed["post_treatment"][str(tid)] for tid in missing_treatments})
+            computed_analyses = {kind: {"etag": make_etag(body), "body": body, **source} for kind, body in bodies.items()}
+            await run_in_threadpool(routine_storage.save_analyses, routine_id, computed_analyses, stored_routine)
+            analyses.update(computed_analyses)
+        
+        body = {part: analyses[part]["body"] for part in ANALYSIS_PARTS if part in parts}
+        if treatment_ids:
+            body["post_treatment"] = {str(tid): analyses[f"post_treatment:{tid}"]["body"] for tid in treatment_ids}
+        return json_response_with_etag(request, body, make_etag([analyses[kind]["etag"] for kind in kinds]))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error analyzing routine {routine_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{routine_id}/analyze/interactions", response_model=List[InteractionResult])
-async def analyze_interactions(routine_id: str):
+async def analyze_interactions(routine_id: str, request: Request):
     """Analyze ingredient interactions in a routine"""
     try:
-        stored_routine = routine_storage.get_routine(routine_id)
+        stored_routine = await run_in_threadpool(routine_storage.get_routine, routine_id)
         if not stored_routine:
             raise HTTPException(status_code=404, detail="Routine not found")
         
-        # Convert stored items to RoutineItem objects for analyzer
-        routine_steps = [RoutineItem(**item) for item in stored_routine.get('items', [])]
-        
-        return analyzer.analyze_interactions(routine_steps)
+        return await _serve_analysis(
+            request, routine_id, stored_routine, "interactions", analysis_tasks.analyze_interactions
+        )
         
     except HTTPException:
         raise
@@ -223,17 +585,16 @@ async def analyze_interactions(routine_id: str):
 
 
 @router.get("/{routine_id}/analyze/score", response_model=ScoreResult)
-async def analyze_score(routine_id: str):
+async def analyze_score(routine_id: str, request: Request):
     """Calculate routine category scores"""
     try:
-        stored_routine = routine_storage.get_routine(routine_id)
+        stored_routine = await run_in_threadpool(routine_storage.get_routine, routine_id)
         if not stored_routine:
             raise HTTPException(status_code=404, detail="Routine not found")
         
-        # Convert stored items to RoutineItem objects for analyzer
-        routine_steps = [RoutineItem(**item) for item in stored_routine.get('items', [])]
-        
-        return analyzer.calculate_routine_score(routine_steps)
+        return await _serve_analysis(
+            request, routine_id, stored_routine, "score", analysis_tasks.calculate_routine_score
+        )
         
     except HTTPException:
         raise
@@ -243,20 +604,78 @@ async def analyze_score(routine_id: str):
 
 
 @router.get("/{routine_id}/analyze/post-treatment/{treatment_id}", response_model=TreatmentAnalysis)
-async def analyze_post_treatment(routine_id: str, treatment_id: int):
+async def analyze_post_treatment(routine_id: str, treatment_id: int, request: Request):
     """Analyze routine safety after treatment"""
     try:
-        stored_routine = routine_storage.get_routine(routine_id)
+        stored_routine = await run_in_threadpool(routine_storage.get_routine, routine_id)
         if not stored_routine:
             raise HTTPException(status_code=404, detail="Routine not found")
         
-        # Convert stored items to RoutineItem objects for analyzer
+        return await _serve_analysis(
+            request, routine_id, stored_routine, f"post_treatment:{treatment_id}",
+            analysis_tasks.analyze_post_treatment, treatment_id
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error analyzing post-treatment: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{routine_id}/analyze/delta", response_model=RoutineDelta)
+async def analyze_delta(routine_id: str, request: RoutineDeltaRequest):
+    """What adding or removing one product would change, without re-analyzing or storing the routine"""
+    try:
+        stored_routine = await run_in_threadpool(routine_storage.get_routine, routine_id)
+        if not stored_routine:
+            raise HTTPException(status_code=404, detail="Routine not found")
+        
+        in_routine = request.product_id in stored_routine.get('product_ids', [])
+        if request.action == "add":
+            if request.product_id not in data_manager.product_index:
+                raise HTTPException(status_code=400, detail=f"Invalid product IDs: {[request.product_id]}")
+            if in_routine:
+                raise HTTPException(status_code=400, detail="Product is already in the routine")
+        elif not in_routine:
+            raise HTTPException(status_code=400, detail="Product is not in the routine")
+        
         routine_steps = [RoutineItem(**item) for item in stored_routine.get('items', [])]
+        return await run_analysis(
+            len(routine_steps), analysis_tasks.analyze_delta, request.product_id, request.action, routine_steps
+        )
         
-        return analyzer.analyze_post_treatment(treatment_id, routine_steps)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error analyzing routine delta: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{routine_id}/recommendations", response_model=ProductRecommendations)
+async def recommend_products(
+    routine_id: str,
+    product_type: Optional[str] = Query(None, description="Only consider products of this type, e.g. serum"),
+    k: int = Query(10, ge=1, le=100, description="Number of products to return"),
+    clash_penalty: float = Query(1.0, ge=0, description="Ranking penalty per clash the product would add"),
+):
+    """Best catalog products to add to a routine: highest score gain, fewest new clashes"""
+    try:
+        stored_routine = await run_in_threadpool(routine_storage.get_routine, routine_id)
+        if not stored_routine:
+            raise HTTPException(status_code=404, detail="Routine not found")
+        if product_type and product_type.strip().lower() not in data_manager.products_by_type:
+            raise HTTPException(status_code=400, detail=f"Unknown product type: {product_type}")
+        
+        routine_steps = [RoutineItem(**item) for item in stored_routine.get('items', [])]
+        # Sized by the catalog: every product is a candidate
+        return await run_analysis(
+            len(data_manager.product_index), analysis_tasks.recommend_products,
+            product_type, k, clash_penalty, routine_steps
+        )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error analyzing post-treatment: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.error(f"Error recommending products: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
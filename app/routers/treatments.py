@@ -8,9 +8,7 @@ router = APIRouter(prefix="/treatments", tags=["treatments"])
 @router.get("")
 async def get_treatments():
     """Get all available treatments"""
-    if data_manager.treatments.empty:
-        return []
-    return data_manager.treatments.to_dict(orient="records")
+    return data_manager.treatments.records()
 
 @router.get("/{treatment_id}")
 async def get_treatment(treatment_id: int):
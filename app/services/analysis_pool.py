@@ -0,0 +1,260 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.db import data_manager
+from app.core.settings import settings
+from app.models.routine import (
+    InteractionResult,
+    ProductRecommendations,
+    RoutineAnalysis,
+    RoutineDelta,
+    RoutineItem,
+    ScoreResult,
+)
+from app.models.treatment import TreatmentAnalysis
+from app.services.routine_service import RoutineService
+from app.services.skincare_analyzer import CustomIngredients, analyzer
+
+# Task functions: module-level so the process pool can pickle them by name.
+# In a worker process they run against that process's own catalog and analyzer.
+_routine_service = RoutineService()
+
+
+def analyze_interactions(items: List[RoutineItem]) -> List[InteractionResult]:
+    return analyzer.analyze_interactions(items)
+
+
+def calculate_routine_score(items: List[RoutineItem]) -> ScoreResult:
+    return analyzer.calculate_routine_score(items)
+
+
+def analyze_post_treatment(treatment_id: int, items: List[RoutineItem]) -> TreatmentAnalysis:
+    return analyzer.analyze_post_treatment(treatment_id, items)
+
+
+def analyze_routine(
+    interactions: bool, score: bool, treatment_ids: Tuple[int, ...], items: List[RoutineItem]
+) -> RoutineAnalysis:
+    return analyzer.analyze_routine(items, interactions, score, treatment_ids)
+
+
+def analyze_ad_hoc(
+    product_ids: List[int], custom: CustomIngredients, interactions: bool, score: bool, treatment_ids: Tuple[int, ...]
+) -> RoutineAnalysis:
+    return analyzer.analyze_ad_hoc(product_ids, custom, interactions, score, treatment_ids)
+
+
+def analyze_delta(product_id: int, action: str, items: List[RoutineItem]) -> RoutineDelta:
+    if action == "add":
+        # The product as the routine's ordering would place it
+        added = _routine_service.order_routine_products([product_id])[0]
+        return analyzer.analyze_delta(items, added=added)
+    return analyzer.analyze_delta(items, removed_product_id=product_id)
+
+
+def recommend_products(
+    product_type: Optional[str], k: int, clash_penalty: float, items: List[RoutineItem]
+) -> ProductRecommendations:
+    return analyzer.recommend_products(items, product_type, k, clash_penalty)
+
+
+def calculate_routine_scores_batch(routines: List[List[int]]) -> List[ScoreResult]:
+    return analyzer.calculate_routine_scores_batch(routines)
+
+
+def order_routine_products(product_ids: List[int], time_of_day: str) -> List[RoutineItem]:
+    return _routine_service.order_routine_products(product_ids, time_of_day)
+
+
+def order_routines_bulk(routines: List[Tuple[List[int], str]]) -> List[List[Dict]]:
+    """Order many (product_ids, time_of_day) routines, returning items as plain dicts for storage"""
+    return [
+        [step.dict() for step in _routine_service.order_routine_products(product_ids, time_of_day)]
+        for product_ids, time_of_day in routines
+    ]
+
+
+def _preload_catalog():
+    """Process pool initializer: have the catalog loaded before the first task arrives"""
+    # Importing this module normally loads it already (mapped from the compiled snapshot)
+    if data_manager.snapshot is None:
+        data_manager.load_data()
+
+
+def _worker_ready() -> bool:
+    """No-op task: submitted once per process worker to have it spawned and preloaded ahead of time"""
+    return True
+
+
+class PoolUnavailable(Exception):
+    """A task could not run right now; the request can be retried"""
+
+
+class PoolSaturated(PoolUnavailable):
+    """Raised instead of queueing when a pool already has max_pending tasks in flight"""
+
+
+class PoolBroken(PoolUnavailable):
+    """Raised when a worker died under the task; the next task gets a fresh pool"""
+
+
+class _Lane:
+    """One executor with its in-flight accounting"""
+
+    def __init__(self, name: str, workers: int, max_pending: int, factory: Callable[[], Executor]):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self.factory = factory
+        self.executor: Optional[Executor] = None
+        self.in_flight = 0
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "broken": 0, "rejected": 0, "max_queued": 0}
+
+    def get_executor(self) -> Executor:
+        # Created on first use if start() has not created it
+        if self.executor is None:
+            self.executor = self.factory()
+        return self.executor
+
+    def shutdown(self):
+        executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.workers),
+            **self.stats,
+        }
+
+
+class AnalysisPool:
+    """Runs CPU-bound analysis off the event loop on bounded worker pools
+
+    Tasks smaller than process_threshold (products or routines) run on a
+    thread pool; larger ones go to a process pool whose workers load the
+    catalog once at start-up, so they don't hold the GIL of the serving
+    process. Each pool admits at most max_pending tasks (running plus
+    queued); beyond that run() raises PoolSaturated instead of letting the
+    queue, and everyone's latency, grow without bound. If a worker process
+    dies, the tasks it broke raise PoolBroken and the pool is replaced.
+    """
+
+    def __init__(self, threads: int = 4, processes: int = 2, process_threshold: int = 50, max_pending: int = 64):
+        self.process_threshold = process_threshold
+        self.threads = _Lane(
+            "thread", threads, max_pending,
+            lambda: ThreadPoolExecutor(max_workers=threads, thread_name_prefix="analysis"),
+        )
+        self.processes = _Lane(
+            "process", processes, max_pending,
+            lambda: ProcessPoolExecutor(
+                max_workers=processes,
+                # Spawned, not forked: the server process has running threads
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_preload_catalog,
+            ),
+        ) if processes > 0 else None
+        self._lock = threading.Lock()
+        # Process workers hold their own catalog; restart them when it changes
+        data_manager.add_reload_listener(self.recycle_processes)
+
+    def _lane_for(self, size: int) -> _Lane:
+        if self.processes is not None and size >= self.process_threshold:
+            return self.processes
+        return self.threads
+
+    async def run(self, size: int, task: Callable[..., Any], *args: Any) -> Any:
+        """Run task(*args) on the pool that fits size and await its result"""
+        lane = self._lane_for(size)
+        with self._lock:
+            if lane.in_flight >= lane.max_pending:
+                lane.stats["rejected"] += 1
+                raise PoolSaturated(f"Analysis {lane.name} pool is busy ({lane.in_flight} tasks in flight)")
+            lane.in_flight += 1
+            lane.stats["submitted"] += 1
+            lane.stats["max_queued"] = max(lane.stats["max_queued"], lane.in_flight - lane.workers)
+
+        try:
+            executor, future = self._submit(lane, task, *args)
+            result = await asyncio.wrap_future(future)
+        except BrokenExecutor as e:
+            # A worker died (e.g. killed for memory) and took the whole executor with it
+            with self._lock:
+                lane.stats["failed"] += 1
+                lane.stats["broken"] += 1
+                if lane.executor is executor:
+                    lane.shutdown()
+            raise PoolBroken(f"Analysis {lane.name} pool lost a worker; retry the request") from e
+        except Exception:
+            with self._lock:
+                lane.stats["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                lane.in_flight -= 1
+        with self._lock:
+            lane.stats["completed"] += 1
+        return result
+
+    def _submit(self, lane: _Lane, task: Callable[..., Any], *args: Any) -> Tuple[Executor, Future]:
+        """Submit to the lane's executor, replacing one shut down or broken since it was taken"""
+        for _ in range(2):
+            with self._lock:
+                executor = lane.get_executor()
+            try:
+                return executor, executor.submit(task, *args)
+            except RuntimeError:
+                # Retired by recycle_processes() in between, or broken (BrokenExecutor is a RuntimeError)
+                with self._lock:
+                    if lane.executor is executor:
+                        lane.shutdown()
+        raise PoolBroken(f"Analysis {lane.name} pool could not accept the task; retry the request")
+
+    def start(self):
+        """Spawn the process workers now, so the first large task doesn't wait for them to load the catalog"""
+        if self.processes is None:
+            return
+        with self._lock:
+            executor = self.processes.get_executor()
+        try:
+            for _ in range(self.processes.workers):
+                executor.submit(_worker_ready)
+        except RuntimeError:
+            pass  # Retired or broken meanwhile; whoever replaced it starts its own workers
+
+    def recycle_processes(self):
+        """Replace the process pool with fresh workers on the current catalog"""
+        if self.processes is not None:
+            with self._lock:
+                self.processes.shutdown()
+            self.start()
+
+    def shutdown(self):
+        with self._lock:
+            for lane in (self.threads, self.processes):
+                if lane is not None:
+                    lane.shutdown()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "process_threshold": self.process_threshold,
+                "thread": self.threads.snapshot(),
+                "process": self.processes.snapshot() if self.processes is not None else None,
+            }
+
+
+# Global analysis pool instance
+analysis_pool = AnalysisPool(
+    threads=settings.analysis_threads,
+    processes=settings.analysis_processes,
+    process_threshold=settings.analysis_process_threshold,
+    max_pending=settings.analysis_max_pending,
+)
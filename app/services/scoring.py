@@ -1,74 +1,46 @@
-from collections import defaultdict
-import ast
-from typing import Union
-from app.core.db import (
-    get_product_ingredients_id,
-    resolve_ingredient_name,
-    get_interaction,
-    ingredients,
-)
+from typing import Dict, Iterable, List, Optional, Union
+from app.core.db import CatalogSnapshot, data_manager
 
-def get_ingredient_scores(ingredient_ids: list[int]) -> dict:
-    scores = defaultdict(float)
+# Stateless scoring helpers. Category scores are parsed once per catalog
+# snapshot into its score_matrix, which is only ever read here, so these
+# functions are safe to call from many concurrent requests.
 
-    ingredients["category_score"] = ingredients["category_score"].apply(
-        lambda x: ast.literal_eval(x) if isinstance(x, str) else {}
-    )
-    category_map = dict(zip(ingredients["id"], ingredients["category_score"]))
 
-    for ing_id in ingredient_ids:
-        cat_score = category_map.get(ing_id, {})
-        for category, value in cat_score.items():
-            scores[category] += value
-    return dict(scores)
-
-
-def apply_clash_penalty(all_ingredients: list[int]) -> dict:
-    penalty = defaultdict(float)
-    ingredients["category_score"] = ingredients["category_score"].apply(
-        lambda x: ast.literal_eval(x) if isinstance(x, str) else {}
-    )
-    category_map = dict(zip(ingredients["id"], ingredients["category_score"]))
-
-    for i, ing1 in enumerate(all_ingredients):
-        cat1 = set(category_map.get(ing1, {}).keys())
-        for ing2 in all_ingredients[i+1:]:
-            interaction = get_interaction(ing1, ing2)
-            if interaction and interaction["interaction_type"].lower() == "clash":
-                cat2 = set(category_map.get(ing2, {}).keys())
-                shared_cats = cat1 & cat2
-                for cat in shared_cats:
-                    penalty[cat] -= 1
-                # If no shared_cats, do nothing
-    return penalty
-
-
-def routine_score(items: list[Union[int, list[str]]]) -> dict:
+def resolve_item_ingredients(
+    items: List[Union[int, List[str]]], catalog: Optional[CatalogSnapshot] = None
+) -> List[int]:
+    """Resolve product IDs and ingredient names/IDs to unique ingredient IDs"""
+    catalog = catalog or data_manager.snapshot
     all_ingredients = []
 
-    for idx, item in enumerate(items):
+    for item in items:
         if isinstance(item, int):  # product ID
-            all_ingredients += get_product_ingredients_id(item)
+            all_ingredients += catalog.get_product_ingredient_ids(item)
         elif isinstance(item, list):  # ingredient names
             for ing in item:
-                try:
-                    ing_id = int(ing)
-                except ValueError:
-                    ing_id = resolve_ingredient_name(ing)
+                ing_id = catalog.resolve_ingredient(ing)
                 if ing_id is not None:
                     all_ingredients.append(ing_id)
 
     # Deduplicate
-    all_ingredients = list(set(map(int, all_ingredients)))
+    return list(set(map(int, all_ingredients)))
+
+
+def get_ingredient_scores(ingredient_ids: Iterable[int]) -> Dict[str, float]:
+    """Sum category scores over the given ingredients"""
+    matrix = data_manager.score_matrix
+    rows = matrix.rows(ingredient_ids)
+    return matrix.to_category_dict(matrix.category_totals(rows), matrix.presence[rows].any(axis=0))
+
 
-    # Category scores
-    score = get_ingredient_scores(all_ingredients)
+def apply_clash_penalty(all_ingredients: Iterable[int]) -> Dict[str, float]:
+    """-1 per clashing pair for each category both ingredients score in"""
+    matrix = data_manager.score_matrix
+    penalties = matrix.clash_penalties(matrix.rows(all_ingredients))
+    return matrix.to_category_dict(penalties, penalties != 0)
 
-    # Clash penalty
-    clash_penalties = apply_clash_penalty(all_ingredients)
 
-    # Combine with category scores
-    for cat, val in clash_penalties.items():
-        score[cat] += val
-        
-    return score
+def routine_score(items: List[Union[int, List[str]]]) -> Dict[str, float]:
+    """Category scores (with clash penalties) for a mix of product IDs and ingredient names"""
+    catalog = data_manager.snapshot
+    return catalog.score_matrix.score(resolve_item_ingredients(items, catalog))
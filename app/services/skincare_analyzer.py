@@ -1,23 +1,64 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Callable, Hashable, Optional, Tuple
+from bisect import bisect_right
 from collections import defaultdict
 import ast
-from app.models.routine import RoutineItem, InteractionResult, ScoreResult
+import numpy as np
+from app.models.routine import (
+    InteractionResult,
+    ProductRecommendation,
+    ProductRecommendations,
+    RoutineAnalysis,
+    RoutineDelta,
+    RoutineItem,
+    ScoreResult,
+)
 from app.models.treatment import TreatmentAnalysis
-from app.core.db import data_manager
+from app.core.cache import TTLCache
+from app.core.db import CatalogSnapshot, data_manager
+from app.core.utils import routine_fingerprint
+
+# Custom ingredient groups of an ad-hoc routine: ((label, ingredient_ids), ...)
+CustomIngredients = Tuple[Tuple[str, Tuple[int, ...]], ...]
 
 class SkincareAnalyzer:
     """Main business logic for skincare analysis"""
     
-    def __init__(self):
+    def __init__(self, cache_size: int = 4096, cache_ttl: float = 600.0):
         self.dm = data_manager
+        # Results keyed by the routine's product fingerprint and the catalog version
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.dm.add_reload_listener(self.cache.clear)
 
-    def resolve_routine_ingredients(self, items: List[RoutineItem]) -> List[Tuple[int, str]]:
+    def _cached(
+        self, key: Hashable, compute: Callable[[CatalogSnapshot], Any], catalog: Optional[CatalogSnapshot] = None
+    ) -> Any:
+        """Return a memoized analysis result, computing and storing it on a miss
+        
+        The catalog snapshot is taken once, so a result is computed from (and
+        cached under the version of) a single consistent catalog.
+        """
+        catalog = catalog or self.dm.snapshot
+        key = (catalog.version,) + key
+        result = self.cache.get(key)
+        if result is None:
+            result = compute(catalog)
+            self.cache.set(key, result)
+        return result
+
+    @staticmethod
+    def _product_ids(items: List[RoutineItem]) -> List[int]:
+        return [item.product_id for item in items if item.product_id]
+
+    def resolve_routine_ingredients(
+        self, items: List[RoutineItem], catalog: Optional[CatalogSnapshot] = None
+    ) -> List[Tuple[int, str]]:
         """Resolve routine items from steps to (ingredient_id, source_label) pairs"""
+        catalog = catalog or self.dm.snapshot
         resolved = []
         
         for item in items:
             if item.product_id:
-                ingredient_ids = self.dm.get_product_ingredient_ids(item.product_id)
+                ingredient_ids = catalog.get_product_ingredient_ids(item.product_id)
                 # Use product attributes directly
                 label = f"{item.brand_name} - {item.product_name}"
                 resolved.extend([(ing_id, label) for ing_id in ingredient_ids])
@@ -53,83 +94,87 @@ class SkincareAnalyzer:
 
     def analyze_interactions(self, items: List[RoutineItem]) -> List[InteractionResult]:
         """Analyze ingredient interactions in a routine"""
-        resolved = self.resolve_routine_ingredients(items)
+        # Pair orientation follows product order, so the fingerprint keeps it
+        fingerprint = routine_fingerprint(self._product_ids(items), ordered=True)
+        return self._cached(
+            ("interactions", fingerprint),
+            lambda catalog: self._analyze_interactions(self.resolve_routine_ingredients(items, catalog), catalog),
+        )
+    
+    def _analyze_interactions(
+        self, resolved: List[Tuple[int, str]], catalog: CatalogSnapshot
+    ) -> List[InteractionResult]:
+        # Only pairs present in the interaction adjacency are visited
+        pairs = catalog.interaction_index.find_pairs([ing_id for ing_id, _ in resolved])
+        return self._interaction_results(resolved, pairs, catalog)
+    
+    @staticmethod
+    def _interaction_results(
+        resolved: List[Tuple[int, str]], pairs: List[Tuple[int, int, Dict]], catalog: CatalogSnapshot
+    ) -> List[InteractionResult]:
+        """InteractionResults for (i, j, interaction_data) positions into resolved"""
         interactions = []
-        
-        for i, (ing_a, source_a) in enumerate(resolved):
-            for ing_b, source_b in resolved[i+1:]:
-                if ing_a != ing_b:  # Don't compare ingredient with itself
-                    interaction_data = self.dm.get_interaction(ing_a, ing_b)
-                    
-                    if interaction_data:
-                        interactions.append(InteractionResult(
-                            ingredient_a=ing_a,
-                            ingredient_b=ing_b,
-                            ingredient_a_name=self.dm.ingredient_lookup.get(ing_a, "Unknown"),
-                            ingredient_b_name=self.dm.ingredient_lookup.get(ing_b, "Unknown"),
-                            product_a=source_a,
-                            product_b=source_b,
-                            **interaction_data
-                        ))
+        for i, j, interaction_data in pairs:
+            ing_a, source_a = resolved[i]
+            ing_b, source_b = resolved[j]
+            interactions.append(InteractionResult(
+                ingredient_a=ing_a,
+                ingredient_b=ing_b,
+                ingredient_a_name=catalog.ingredient_lookup.get(ing_a, "Unknown"),
+                ingredient_b_name=catalog.ingredient_lookup.get(ing_b, "Unknown"),
+                product_a=source_a,
+                product_b=source_b,
+                **interaction_data
+            ))
 
         return interactions
         
         
-    def calculate_routine_score(self, items: List[RoutineItem]) -> ScoreResult:
-        """Calculate routine category scores"""
-        resolved = self.resolve_routine_ingredients(items)
-        all_ingredient_ids = list(set([ing_id for ing_id, _ in resolved]))
-        
-        category_scores = defaultdict(float)
-        
-        # Calculate scores from ingredients
-        for ing_id in all_ingredient_ids:
-            ingredient = self.dm.get_ingredient_by_id(ing_id)
-            if ingredient and ingredient.category_scores:
-                for category, score in ingredient.category_scores.items():
-                    category_scores[category] += score
-        
-        # Apply clash penalties
-        clash_penalties = self._calculate_clash_penalties(all_ingredient_ids)
-        for category, penalty in clash_penalties.items():
-            category_scores[category] += penalty
+    def calculate_routine_score(
+        self, items: List[RoutineItem], catalog: Optional[CatalogSnapshot] = None
+    ) -> ScoreResult:
+        """Calculate routine category scores (from the given catalog snapshot, else the current one)"""
+        fingerprint = routine_fingerprint(self._product_ids(items))
+        return self._cached(
+            ("score", fingerprint),
+            lambda catalog: self._calculate_routine_score(self.resolve_routine_ingredients(items, catalog), catalog),
+            catalog,
+        )
+    
+    def _calculate_routine_score(self, resolved: List[Tuple[int, str]], catalog: CatalogSnapshot) -> ScoreResult:
+        # Column sums over the routine's rows of the category matrix, minus clash penalties
+        category_scores = catalog.score_matrix.score(ing_id for ing_id, _ in resolved)
         
         return ScoreResult(
-            category_scores=dict(category_scores),
+            category_scores=category_scores,
             total_score=sum(category_scores.values())
         )
     
-    def _calculate_clash_penalties(self, ingredient_ids: List[int]) -> Dict[str, float]:
-        """Calculate penalties for ingredient clashes"""
-        penalties = defaultdict(float)
-        
-        # Build category map for ingredients
-        category_map = {}
-        for ing_id in ingredient_ids:
-            ingredient = self.dm.get_ingredient_by_id(ing_id)
-            if ingredient and ingredient.category_scores:
-                category_map[ing_id] = set(ingredient.category_scores.keys())
-        
-        # Check for clashes
-        for i, ing_a in enumerate(ingredient_ids):
-            for ing_b in ingredient_ids[i+1:]:
-                interaction = self.dm.get_interaction(ing_a, ing_b)
-                
-                if interaction and interaction["interaction_type"].lower() == "clash":
-                    shared_categories = category_map.get(ing_a, set()) & category_map.get(ing_b, set())
-                    for category in shared_categories:
-                        penalties[category] -= 1.0
-        
-        return dict(penalties)
+    def calculate_routine_scores_batch(self, routines: List[List[int]]) -> List[ScoreResult]:
+        """Calculate category scores for many routines (lists of product IDs) at once"""
+        return [
+            ScoreResult(category_scores=category_scores, total_score=sum(category_scores.values()))
+            for category_scores in self.dm.score_matrix.score_batch(routines)
+        ]
     
     def analyze_post_treatment(self, treatment_id: int, items: List[RoutineItem]) -> TreatmentAnalysis:
         """Analyze routine safety after treatment"""
-        treatment_rules = self.dm.get_treatment_rules(treatment_id)
+        fingerprint = routine_fingerprint(self._product_ids(items), treatment_id=treatment_id)
+        return self._cached(
+            ("post_treatment", fingerprint),
+            lambda catalog: self._analyze_post_treatment(
+                treatment_id, self.resolve_routine_ingredients(items, catalog), catalog
+            ),
+        )
+    
+    def _analyze_post_treatment(
+        self, treatment_id: int, resolved: List[Tuple[int, str]], catalog: CatalogSnapshot
+    ) -> TreatmentAnalysis:
+        treatment_rules = catalog.get_treatment_rules(treatment_id)
         
         if not treatment_rules:
             raise ValueError("No rules found for this treatment")
         
-        resolved = self.resolve_routine_ingredients(items)
         flagged = defaultdict(list)
         
         # Create rule lookup
@@ -146,14 +191,14 @@ class SkincareAnalyzer:
             if ing_id in rule_lookup:
                 rule = rule_lookup[ing_id]
                 flagged[source].append({
-                    "ingredient": self.dm.ingredient_lookup.get(ing_id, "Unknown"),
+                    "ingredient": catalog.ingredient_lookup.get(ing_id, "Unknown"),
                     "ingredient_id": ing_id,
                     "action": rule["advice"],
                     "duration_days": rule["duration_days"],
                     "reason": rule["reason"]
                 })
         
-        treatment_info = self.dm.get_treatment_info(treatment_id)
+        treatment_info = catalog.get_treatment_info(treatment_id)
         if treatment_info:
             treatment_name = treatment_info["treatment_name"]  # e.g., "chemical_peel"
             treatment_display_name = treatment_info.get("display_name", treatment_name.replace("_", " ").title())
@@ -163,6 +208,224 @@ class SkincareAnalyzer:
             display_name=treatment_display_name,
             flagged_products=dict(flagged)
         )
+    
+    def analyze_routine(
+        self,
+        items: List[RoutineItem],
+        interactions: bool = True,
+        score: bool = True,
+        treatment_ids: Tuple[int, ...] = (),
+    ) -> RoutineAnalysis:
+        """Several analyses of one routine against one catalog snapshot
+        
+        Each part is memoized under the same key as its single-analysis
+        method; the routine's ingredients are resolved at most once and the
+        result shared by every part that has to be computed.
+        """
+        catalog = self.dm.snapshot
+        return self._analyze(
+            catalog, self._product_ids(items), lambda: self.resolve_routine_ingredients(items, catalog), (),
+            interactions, score, treatment_ids,
+        )
+    
+    def analyze_ad_hoc(
+        self,
+        product_ids: List[int],
+        custom: CustomIngredients = (),
+        interactions: bool = True,
+        score: bool = True,
+        treatment_ids: Tuple[int, ...] = (),
+    ) -> RoutineAnalysis:
+        """Analyses of an unsaved routine: catalog products (in order) plus custom ingredient groups
+        
+        custom holds (label, ingredient_ids) groups. With none, results are
+        identical to (and cached with) a stored routine of the same products.
+        """
+        catalog = self.dm.snapshot
+        return self._analyze(
+            catalog, product_ids, lambda: self.resolve_ad_hoc_ingredients(product_ids, custom, catalog), custom,
+            interactions, score, treatment_ids,
+        )
+    
+    def resolve_ad_hoc_ingredients(
+        self, product_ids: List[int], custom: CustomIngredients = (), catalog: Optional[CatalogSnapshot] = None
+    ) -> List[Tuple[int, str]]:
+        """Resolve product IDs and custom groups to (ingredient_id, source_label) pairs"""
+        catalog = catalog or self.dm.snapshot
+        resolved = []
+        
+        for product_id in product_ids:
+            product = catalog.get_product_by_id(product_id)
+            if product:
+                label = f"{product.brand_name} - {product.product_name}"
+                resolved.extend([(ing_id, label) for ing_id in catalog.get_product_ingredient_ids(product_id)])
+        for label, ingredient_ids in custom:
+            resolved.extend([(ing_id, label) for ing_id in ingredient_ids])
+        
+        return resolved
+    
+    def _analyze(
+        self,
+        catalog: CatalogSnapshot,
+        product_ids: List[int],
+        resolve: Callable[[], List[Tuple[int, str]]],
+        custom: CustomIngredients,
+        interactions: bool,
+        score: bool,
+        treatment_ids: Tuple[int, ...],
+    ) -> RoutineAnalysis:
+        shared: List[List[Tuple[int, str]]] = []
+        
+        def resolved() -> List[Tuple[int, str]]:
+            if not shared:
+                shared.append(resolve())
+            return shared[0]
+        
+        # Custom ingredients extend the product fingerprint's cache key
+        extra = (tuple(custom),) if custom else ()
+        analysis = RoutineAnalysis()
+        if interactions:
+            analysis.interactions = self._cached(
+                ("interactions", routine_fingerprint(product_ids, ordered=True)) + extra,
+                lambda catalog: self._analyze_interactions(resolved(), catalog),
+                catalog,
+            )
+        if score:
+            analysis.score = self._cached(
+                ("score", routine_fingerprint(product_ids)) + extra,
+                lambda catalog: self._calculate_routine_score(resolved(), catalog),
+                catalog,
+            )
+        if treatment_ids:
+            analysis.post_treatment = {}
+        for treatment_id in treatment_ids:
+            analysis.post_treatment[treatment_id] = self._cached(
+                ("post_treatment", routine_fingerprint(product_ids, treatment_id=treatment_id)) + extra,
+                lambda catalog: self._analyze_post_treatment(treatment_id, resolved(), catalog),
+                catalog,
+            )
+        return analysis
+
+    def analyze_delta(
+        self, items: List[RoutineItem], added: Optional[RoutineItem] = None, removed_product_id: Optional[int] = None
+    ) -> RoutineDelta:
+        """How the analysis of an ordered routine changes when one product is added or removed
+        
+        Instead of re-analyzing the whole routine, only pairs between the
+        changed product's k ingredients and the other n ingredients (and
+        within the product itself) are visited: O(k * n) rather than O(n**2).
+        The routine's current score comes from the cache when it is there.
+        Results match a full re-analysis of the changed routine, with pairs
+        oriented by the changed routine's step order.
+        """
+        catalog = self.dm.snapshot
+        if added is not None:
+            # Where ordering would put it: items are sorted by (step, texture, product)
+            keys = [(item.step_order, item.texture_order, item.product_id) for item in items]
+            position = bisect_right(keys, (added.step_order, added.texture_order, added.product_id))
+            changed, others = added, items
+            product_id, sign = added.product_id, 1.0
+        else:
+            positions = [idx for idx, item in enumerate(items) if item.product_id == removed_product_id]
+            if not positions:
+                raise ValueError(f"Product {removed_product_id} is not in the routine")
+            position = positions[0]
+            changed, others = items[position], items[:position] + items[position + 1:]
+            product_id, sign = removed_product_id, -1.0
+        
+        # Full routine = others with the changed product's ingredients spliced in at split
+        per_item = [self.resolve_routine_ingredients([item], catalog) for item in others]
+        others_resolved = [pair for resolved in per_item for pair in resolved]
+        changed_resolved = self.resolve_routine_ingredients([changed], catalog)
+        split = sum(len(resolved) for resolved in per_item[:position])
+        full_resolved = others_resolved[:split] + changed_resolved + others_resolved[split:]
+        
+        index = catalog.interaction_index
+        changed_ids = [ing_id for ing_id, _ in changed_resolved]
+        pairs = [
+            (i, split + j, data) if i < split else (split + j, i + len(changed_resolved), data)
+            for i, j, data in index.find_pairs_between([ing_id for ing_id, _ in others_resolved], changed_ids)
+        ]
+        pairs += [(split + i, split + j, data) for i, j, data in index.find_pairs(changed_ids)]
+        pairs.sort(key=lambda pair: (pair[0], pair[1]))
+        interactions = self._interaction_results(full_resolved, pairs, catalog)
+        
+        # Score: the current routine's score plus the rows the product brings (or takes away)
+        matrix = catalog.score_matrix
+        other_rows = matrix.rows(ing_id for ing_id, _ in others_resolved)
+        changed_rows = np.setdiff1d(matrix.rows(changed_ids), other_rows)
+        delta = sign * matrix.score_delta(other_rows, changed_rows)
+        current = self.calculate_routine_score(items, catalog)  # Same snapshot as the delta
+        values = np.zeros(len(matrix.categories))
+        for category, value in current.category_scores.items():
+            values[matrix.category_positions[category]] = value
+        values += delta
+        if added is not None:
+            touched = matrix.presence[changed_rows].any(axis=0)
+            touched[[matrix.category_positions[category] for category in current.category_scores]] = True
+        else:
+            touched = matrix.presence[other_rows].any(axis=0)
+        category_scores = matrix.to_category_dict(values, touched)
+        total_score = sum(category_scores.values())
+        
+        return RoutineDelta(
+            action="add" if added is not None else "remove",
+            product_id=product_id,
+            added_interactions=interactions if added is not None else [],
+            removed_interactions=interactions if added is None else [],
+            category_deltas=matrix.to_category_dict(delta, delta != 0),
+            total_score_delta=total_score - current.total_score,
+            score=ScoreResult(category_scores=category_scores, total_score=total_score),
+        )
+
+    def recommend_products(
+        self, items: List[RoutineItem], product_type: Optional[str] = None, k: int = 10, clash_penalty: float = 1.0
+    ) -> ProductRecommendations:
+        """Top k catalog products to add to a routine, by score gain minus clash_penalty per new clash
+        
+        Every candidate (optionally of one product type, never one already in
+        the routine) is scored in one vectorized pass; only the k winners are
+        fully sorted and get per-category deltas.
+        """
+        catalog = self.dm.snapshot
+        matrix = catalog.score_matrix
+        in_routine = set(self._product_ids(items))
+        pool = catalog.products_by_type.get(product_type.strip().lower(), ()) if product_type else catalog.product_index
+        candidates = [pid for pid in pool if pid not in in_routine and pid in matrix.product_positions]
+        if not candidates or k <= 0:
+            return ProductRecommendations(candidates=len(candidates), recommendations=[])
+        
+        base_rows = matrix.rows(ing_id for ing_id, _ in self.resolve_routine_ingredients(items, catalog))
+        positions = np.array([matrix.product_positions[pid] for pid in candidates], dtype=np.intp)
+        gains, clashes = matrix.candidate_gains(base_rows, positions)
+        ranking = gains - clash_penalty * clashes
+        
+        # Partial sort: keep every candidate ranked at least the k-th best, so ties at the
+        # boundary are broken by product ID too, then order just those and cut to k
+        if len(candidates) > k:
+            kth = np.partition(ranking, len(candidates) - k)[len(candidates) - k]
+            top = np.flatnonzero(ranking >= kth)
+        else:
+            top = np.arange(len(candidates))
+        candidate_ids = np.array(candidates, dtype=np.int64)[top]
+        top = top[np.lexsort((candidate_ids, -ranking[top]))][:k].tolist()
+        
+        recommendations = []
+        for idx in top:
+            product = catalog.product_index[candidates[idx]]
+            added_rows = np.setdiff1d(matrix.rows(catalog.get_product_ingredient_ids(product.product_id)), base_rows)
+            delta = matrix.score_delta(base_rows, added_rows)
+            recommendations.append(ProductRecommendation(
+                product_id=product.product_id,
+                brand_name=product.brand_name,
+                product_name=product.product_name,
+                product_type=product.product_type,
+                score_gain=float(gains[idx]),
+                new_clashes=int(clashes[idx]),
+                rank_score=float(ranking[idx]),
+                category_deltas=matrix.to_category_dict(delta, delta != 0),
+            ))
+        return ProductRecommendations(candidates=len(candidates), recommendations=recommendations)
 
 # Global analyzer instance
 analyzer = SkincareAnalyzer()
\ No newline at end of file
@@ -1,8 +1,14 @@
+import bisect
 import json
+import os
+import sqlite3
+import threading
+import time
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Protocol
+from typing import Dict, Iterator, List, Optional, Protocol, Tuple
+from app.core.settings import settings
 from app.models.routine import RoutineResponse
 
 
@@ -21,6 +27,14 @@ class RoutineStorageInterface(Protocol):
         """Update an existing routine"""
         ...
     
+    def create_routines(self, routines: List[Dict]) -> List[str]:
+        """Create many routines in one storage transaction; returns their IDs in order"""
+        ...
+    
+    def update_routines(self, updates: List[Tuple[str, Dict]]) -> List[bool]:
+        """Apply many (routine_id, update_data) updates in one storage transaction; False where not found"""
+        ...
+    
     def delete_routine(self, routine_id: str) -> bool:
         """Delete a routine"""
         ...
@@ -28,14 +42,65 @@ class RoutineStorageInterface(Protocol):
     def list_routines(self) -> List[RoutineResponse]:
         """List all routines as RoutineResponse objects"""
         ...
+    
+    def save_analysis(self, routine_id: str, kind: str, analysis: Dict, expected: Optional[Dict] = None) -> bool:
+        """Store a precomputed analysis result with a routine (dropped when its products change)"""
+        ...
+    
+    def save_analyses(self, routine_id: str, analyses: Dict[str, Dict], expected: Optional[Dict] = None) -> bool:
+        """Store several {kind: analysis} results with a routine in one write
+        
+        With expected (the routine as it was read), this is a compare-and-set:
+        nothing is stored if the routine's products or steps changed since.
+        """
+        ...
+    
+    def iter_routines(
+        self,
+        user_id: Optional[str] = None,
+        time_of_day: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        product_id: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """Stream routines in (created_at, routine_id) order, starting after a cursor
+        
+        user_id, time_of_day and product_id (routines containing that product) filter the stream.
+        """
+        ...
+    
+    def close(self):
+        """Make every write so far durable and release the store (at shutdown)"""
+        ...
 
 
 class JSONRoutineStore:
-    """JSON file-based storage for routines"""
+    """JSON file-based storage for routines
     
-    def __init__(self, storage_path: str = "storage/routines.json"):
+    Mutations are serialized per routine by striped locks and never modify a
+    stored routine dict in place (each write publishes a new dict), so readers
+    and the file writer always see whole routines. A single writer thread
+    rewrites the file: mutations arriving within `coalesce_window` seconds of
+    each other share one atomic, fsynced flush, and each mutating call returns
+    once the flush that includes it is on disk (or raises OSError if it failed).
+    """
+    
+    def __init__(self, storage_path: str = "storage/routines.json", stripes: int = 64, coalesce_window: float = 0.002):
         self.storage_path = Path(storage_path)
         self.routines = self._load_routines()
+        self._order = _CreationOrder(self.routines)
+        self.coalesce_window = coalesce_window
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        
+        # Writer state: mutations bump _generation; the writer publishes _flushed_generation,
+        # or _failed_generation and _write_error when a flush did not reach disk
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._flushed_generation = 0
+        self._failed_generation = 0
+        self._write_error: Optional[Exception] = None
+        self._closed = False
+        self._writer: Optional[threading.Thread] = None
+        self.flush_count = 0
     
     def _load_routines(self) -> Dict:
         """Load routines from JSON file"""
@@ -48,28 +113,101 @@ class JSONRoutineStore:
                 return {}
         return {}
     
-    def _save_routines(self):
-        """Save routines to JSON file"""
-        try:
-            # Create directory if it doesn't exist
-            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+    def _save_routines(self, routines: Dict):
+        """Write routines to the JSON file atomically (temp file, fsync, rename)"""
+        # Create directory if it doesn't exist
+        self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        tmp_path = self.storage_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            # Compact one-shot encoding uses the C encoder; indent=2 was ~4x slower
+            f.write(json.dumps(routines, separators=(',', ':'), default=str))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.storage_path)
+    
+    def _stripe(self, routine_id: str) -> threading.Lock:
+        return self._stripes[hash(routine_id) % len(self._stripes)]
+    
+    def _write_loop(self):
+        """Writer thread: coalesce pending mutations into one flush at a time"""
+        while True:
+            with self._cond:
+                while self._generation == self._settled_generation() and not self._closed:
+                    self._cond.wait()
+                if self._generation == self._settled_generation():
+                    return  # Closed with nothing left to write
             
-            with open(self.storage_path, 'w') as f:
-                json.dump(self.routines, f, indent=2, default=str)
-        except Exception as e:
-            print(f"Error saving routines: {e}")
+            # Let concurrent mutations pile up so they share this flush
+            time.sleep(self.coalesce_window)
+            with self._cond:
+                generation = self._generation
+            try:
+                # Stored routine dicts are replaced, never mutated, so a shallow copy is a consistent state
+                self._save_routines(dict(self.routines))
+                error = None
+            except Exception as e:
+                print(f"Error saving routines: {e}")
+                error = e
+            
+            with self._cond:
+                if error is None:
+                    self._flushed_generation = generation
+                    self.flush_count += 1
+                else:
+                    # Fail the waiting writers; the next mutation retries the whole flush
+                    self._failed_generation = generation
+                    self._write_error = error
+                self._cond.notify_all()
+    
+    def _settled_generation(self) -> int:
+        """Last generation whose flush finished, successfully or not (_cond held)"""
+        return max(self._flushed_generation, self._failed_generation)
+    
+    def _wait_for(self, generation: int):
+        """Block until generation's flush finishes; raise if it did not reach disk (_cond held)"""
+        while self._settled_generation() < generation:
+            self._cond.wait()
+        if self._flushed_generation < generation:
+            raise OSError(f"Routines were not saved to {self.storage_path}: {self._write_error}")
+    
+    def _commit(self):
+        """Wait until the mutation just applied in memory has been flushed to disk (OSError if it failed)"""
+        with self._cond:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="routine-json-writer", daemon=True)
+                self._writer.start()
+            self._generation += 1
+            generation = self._generation
+            self._cond.notify_all()
+            self._wait_for(generation)
+    
+    def flush(self):
+        """Wait for every mutation so far to reach disk"""
+        with self._cond:
+            self._wait_for(self._generation)
+    
+    def close(self):
+        """Flush pending mutations and stop the writer thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
     
     def create_routine(self, routine_data: Dict) -> str:
         """Store routine data with generated ID"""
-        routine_id = str(uuid.uuid4())
-        routine_data = routine_data.copy()
-        routine_data['routine_id'] = routine_id
-        routine_data['created_at'] = datetime.now().isoformat()
-        routine_data['updated_at'] = datetime.now().isoformat()
-        
-        self.routines[routine_id] = routine_data
-        self._save_routines()
-        return routine_id
+        return self.create_routines([routine_data])[0]
+    
+    def create_routines(self, routines: List[Dict]) -> List[str]:
+        """Store many routines with generated IDs; all of them share one flush"""
+        created = [_new_routine(routine_data) for routine_data in routines]
+        for routine in created:
+            self.routines[routine['routine_id']] = routine
+            self._order.replace(routine['routine_id'], None, routine)
+        self._commit()
+        return [routine['routine_id'] for routine in created]
     
     def get_routine(self, routine_id: str) -> Optional[Dict]:
         """Get routine data"""
@@ -77,28 +215,694 @@ class JSONRoutineStore:
     
     def update_routine(self, routine_id: str, update_data: Dict) -> bool:
         """Update routine with new data"""
-        if routine_id not in self.routines:
-            return False
+        return self.update_routines([(routine_id, update_data)])[0]
+    
+    def update_routines(self, updates: List[Tuple[str, Dict]]) -> List[bool]:
+        """Apply many updates in order; all of them share one flush"""
+        results = []
+        for routine_id, update_data in updates:
+            with self._stripe(routine_id):
+                existing = self.routines.get(routine_id)
+                if existing is not None:
+                    self.routines[routine_id] = _updated_routine(existing, update_data)
+                    self._order.replace(routine_id, existing, self.routines[routine_id])
+            results.append(existing is not None)
+        if any(results):
+            self._commit()
+        return results
+    
+    def delete_routine(self, routine_id: str) -> bool:
+        """Delete routine"""
+        with self._stripe(routine_id):
+            existing = self.routines.pop(routine_id, None)
+            if existing is None:
+                return False
+            self._order.replace(routine_id, existing, None)
+        self._commit()
+        return True
+    
+    def list_routines(self) -> List[Dict]:
+        """List all routines"""
+        return list(self.routines.values())
+    
+    def save_analysis(self, routine_id: str, kind: str, analysis: Dict, expected: Optional[Dict] = None) -> bool:
+        """Store an analysis result under the routine without touching updated_at"""
+        return self.save_analyses(routine_id, {kind: analysis}, expected)
+    
+    def save_analyses(self, routine_id: str, analyses: Dict[str, Dict], expected: Optional[Dict] = None) -> bool:
+        """Store several analysis results under the routine with one flush, unless it changed from expected"""
+        with self._stripe(routine_id):
+            existing = self.routines.get(routine_id)
+            if existing is None or (expected is not None and _changes_products(existing, expected)):
+                return False
+            
+            updated = dict(existing)
+            updated['analysis'] = {**updated.get('analysis', {}), **analyses}
+            self.routines[routine_id] = updated
+        self._commit()
+        return True
+    
+    def iter_routines(
+        self,
+        user_id: Optional[str] = None,
+        time_of_day: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        product_id: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """Stream routines in creation order, starting after a (created_at, routine_id) cursor"""
+        return _iter_in_order(self.routines, self._order, after, user_id, time_of_day, product_id)
+
+
+class JournaledRoutineStore:
+    """Log-structured storage: JSON-lines journal of operations plus periodic snapshots
+    
+    Every write appends one line to the journal, so write cost does not depend on
+    how many routines are stored. fsync is batched: every `fsync_every` operations,
+    or `fsync_interval` seconds after a write by a background thread if no other
+    write comes first. Every `compact_every` operations the journal is rotated
+    into a frozen segment and the same thread writes a snapshot and deletes the
+    segment, so writers never wait for a full dump. Startup loads the snapshot
+    and replays any frozen segment, then the journal; a torn last line from a
+    crash is skipped.
+    """
+    
+    def __init__(
+        self,
+        storage_dir: str = "storage",
+        fsync_every: int = 64,
+        fsync_interval: float = 0.05,
+        compact_every: int = 10000,
+    ):
+        self.storage_dir = Path(storage_dir)
+        self.journal_path = self.storage_dir / "routines.journal"
+        self.segment_path = self.storage_dir / "routines.journal.compacting"
+        self.snapshot_path = self.storage_dir / "routines.snapshot.json"
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
         
-        existing = self.routines[routine_id]
-        existing.update(update_data)
-        existing['updated_at'] = datetime.now().isoformat()
+        # Writers read, merge and append under _lock; the maintenance thread waits on _cond
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._compacting: Optional[Dict] = None  # State at the last rotation, until its snapshot is written
+        self._closed = False
+        self._maintainer: Optional[threading.Thread] = None
         
-        self.routines[routine_id] = existing
-        self._save_routines()
-        return True
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.routines = self._load_snapshot()
+        self._order = _CreationOrder(self.routines)
+        self._replay_journal(self.segment_path)
+        self._ops_since_compaction = self._replay_journal(self.journal_path)
+        if self.segment_path.exists():
+            # A compaction was interrupted: finish it before the journal can rotate again
+            self._write_snapshot(self.routines)
+            self.segment_path.unlink()
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        if self._journal.tell() and not self._ends_with_newline():
+            self._journal.write('\n')  # Terminate a torn last line so appends stay parseable
+    
+    def _ends_with_newline(self) -> bool:
+        with open(self.journal_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+    
+    def _load_snapshot(self) -> Dict:
+        """Load the last compacted snapshot, seeding from a legacy routines.json if present"""
+        for path in (self.snapshot_path, self.storage_dir / "routines.json"):
+            if path.exists():
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        return json.load(f)
+                except Exception as e:
+                    print(f"Error loading routines from {path}: {e}")
+                    return {}
+        return {}
+    
+    def _replay_journal(self, path: Path) -> int:
+        """Apply the operations journaled in path on top of the current state; returns the number replayed"""
+        if not path.exists():
+            return 0
+        
+        replayed = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, start=1):
+                try:
+                    self._apply(json.loads(line))
+                    replayed += 1
+                except Exception as e:
+                    print(f"Skipping unreadable entry {line_no} of {path.name}: {e}")
+        return replayed
+    
+    def _apply(self, entry: Dict):
+        """Apply one journal entry to the in-memory state"""
+        routine_id = entry.get('routine_id')
+        if entry['op'] == 'put':
+            existing = self.routines.get(routine_id)
+            self.routines[routine_id] = entry['data']
+            self._order.replace(routine_id, existing, entry['data'])
+        elif entry['op'] == 'delete':
+            self._order.replace(routine_id, self.routines.pop(routine_id, None), None)
+        elif entry['op'] == 'batch':
+            for batched in entry['entries']:
+                self._apply(batched)
+    
+    @staticmethod
+    def _encode(entries: List[Dict]) -> str:
+        """One journal line for the operations, so replay applies all of them or none"""
+        entry = entries[0] if len(entries) == 1 else {'op': 'batch', 'entries': entries}
+        return json.dumps(entry, separators=(',', ':'), default=str)
+    
+    def _log(self, entries: List[Dict], line: Optional[str] = None):
+        """Apply operations and append them to the journal as one line (lock held); fsync/rotate when due"""
+        line = line if line is not None else self._encode(entries)
+        for entry in entries:
+            self._apply(entry)
+        self._journal.write(line + '\n')
+        self._journal.flush()
+        self._unsynced += len(entries)
+        self._ops_since_compaction += len(entries)
+        
+        now = time.monotonic()
+        if self._unsynced >= self.fsync_every or now - self._last_sync >= self.fsync_interval:
+            self._sync(now)
+        if self._ops_since_compaction >= self.compact_every and self._compacting is None:
+            self._rotate()
+        
+        if self._maintainer is None:
+            self._maintainer = threading.Thread(target=self._maintain, name="routine-journal-maintainer", daemon=True)
+            self._maintainer.start()
+        self._cond.notify()
+    
+    def _sync(self, now: Optional[float] = None):
+        os.fsync(self._journal.fileno())
+        self._unsynced = 0
+        self._last_sync = now if now is not None else time.monotonic()
+    
+    def _rotate(self):
+        """Freeze the journal as a segment and start an empty one (lock held); the snapshot is written later"""
+        if self.segment_path.exists():
+            return  # An earlier snapshot failed; its segment must be kept until one succeeds
+        self._sync()
+        self._journal.close()
+        os.replace(self.journal_path, self.segment_path)
+        self._journal = open(self.journal_path, 'w', encoding='utf-8')
+        # Stored routine dicts are replaced, never mutated, so a shallow copy is a consistent state
+        self._compacting = dict(self.routines)
+        self._ops_since_compaction = 0
+    
+    def _write_snapshot(self, routines: Dict):
+        """Write a full snapshot atomically (temp file, fsync, rename)"""
+        tmp_path = self.snapshot_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(routines, f, separators=(',', ':'), default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+    
+    def _maintain(self):
+        """Maintenance thread: fsync writes no later write has synced, and snapshot rotated journals"""
+        while True:
+            with self._cond:
+                while self._compacting is None:
+                    if self._unsynced:
+                        wait = self._last_sync + self.fsync_interval - time.monotonic()
+                        if wait <= 0:
+                            self._sync()
+                            continue
+                    elif self._closed:
+                        return
+                    else:
+                        wait = None
+                    self._cond.wait(wait)
+                routines = self._compacting
+            
+            # The full dump runs without the lock; writers keep appending to the new journal
+            try:
+                self._write_snapshot(routines)
+                self.segment_path.unlink()
+            except Exception as e:
+                print(f"Error compacting routines journal: {e}")
+            with self._cond:
+                self._compacting = None
+    
+    def flush(self):
+        """Force pending journal writes to disk"""
+        with self._lock:
+            if self._unsynced:
+                self._sync()
+    
+    def close(self):
+        """Finish any compaction, then flush and close the journal"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._maintainer is not None:
+            self._maintainer.join()
+            self._maintainer = None
+        with self._lock:
+            if not self._journal.closed:
+                self._sync()
+                self._journal.close()
+    
+    def create_routine(self, routine_data: Dict) -> str:
+        """Store routine data with generated ID"""
+        return self.create_routines([routine_data])[0]
+    
+    def create_routines(self, routines: List[Dict]) -> List[str]:
+        """Store many routines with generated IDs as one journal entry"""
+        created = [_new_routine(routine_data) for routine_data in routines]
+        entries = [{'op': 'put', 'routine_id': routine['routine_id'], 'data': routine} for routine in created]
+        line = self._encode(entries)  # New routines depend on nothing stored, so encode before locking
+        with self._lock:
+            self._log(entries, line)
+        return [routine['routine_id'] for routine in created]
+    
+    def get_routine(self, routine_id: str) -> Optional[Dict]:
+        """Get routine data"""
+        return self.routines.get(routine_id)
+    
+    def update_routine(self, routine_id: str, update_data: Dict) -> bool:
+        """Update routine with new data"""
+        return self.update_routines([(routine_id, update_data)])[0]
+    
+    def update_routines(self, updates: List[Tuple[str, Dict]]) -> List[bool]:
+        """Apply many updates in order as one journal entry"""
+        results, entries, pending = [], [], {}
+        # Read and merge under the lock, so no concurrent write lands in between and is reverted
+        with self._lock:
+            for routine_id, update_data in updates:
+                # Later updates of the same routine build on earlier ones in this batch
+                existing = pending.get(routine_id, self.routines.get(routine_id))
+                results.append(existing is not None)
+                if existing is not None:
+                    pending[routine_id] = _updated_routine(existing, update_data)
+                    entries.append({'op': 'put', 'routine_id': routine_id, 'data': pending[routine_id]})
+            if entries:
+                self._log(entries)
+        return results
     
     def delete_routine(self, routine_id: str) -> bool:
         """Delete routine"""
-        if routine_id in self.routines:
-            del self.routines[routine_id]
-            self._save_routines()
-            return True
-        return False
+        with self._lock:
+            if routine_id not in self.routines:
+                return False
+            self._log([{'op': 'delete', 'routine_id': routine_id}])
+        return True
     
     def list_routines(self) -> List[Dict]:
         """List all routines"""
         return list(self.routines.values())
+    
+    def save_analysis(self, routine_id: str, kind: str, analysis: Dict, expected: Optional[Dict] = None) -> bool:
+        """Store an analysis result under the routine without touching updated_at"""
+        return self.save_analyses(routine_id, {kind: analysis}, expected)
+    
+    def save_analyses(self, routine_id: str, analyses: Dict[str, Dict], expected: Optional[Dict] = None) -> bool:
+        """Store several analysis results under the routine as one journal entry, unless it changed from expected"""
+        with self._lock:
+            existing = self.routines.get(routine_id)
+            if existing is None or (expected is not None and _changes_products(existing, expected)):
+                return False
+            
+            updated = dict(existing)
+            updated['analysis'] = {**updated.get('analysis', {}), **analyses}
+            self._log([{'op': 'put', 'routine_id': routine_id, 'data': updated}])
+        return True
+    
+    def iter_routines(
+        self,
+        user_id: Optional[str] = None,
+        time_of_day: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        product_id: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """Stream routines in creation order, starting after a (created_at, routine_id) cursor"""
+        return _iter_in_order(self.routines, self._order, after, user_id, time_of_day, product_id)
+
+
+class SQLiteRoutineStore:
+    """SQLite storage with WAL, one connection per thread and indexed lookups
+    
+    Routines are stored as JSON documents next to indexed user_id/updated_at
+    columns, and a routine_products join table makes "routines containing
+    product X" an index lookup. Analysis results live in their own table and
+    are dropped whenever a routine's products change.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS routines (
+            routine_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            time_of_day TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_routines_updated_at ON routines(updated_at);
+        CREATE INDEX IF NOT EXISTS idx_routines_created_at ON routines(created_at, routine_id);
+        -- Filtered listings read pages straight off these, in (created_at, routine_id) order
+        CREATE INDEX IF NOT EXISTS idx_routines_user_created ON routines(user_id, created_at, routine_id);
+        CREATE TABLE IF NOT EXISTS routine_products (
+            routine_id TEXT NOT NULL REFERENCES routines(routine_id) ON DELETE CASCADE,
+            product_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL,  -- The routine's (never updated), for listings by product
+            PRIMARY KEY (routine_id, product_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_routine_products_created ON routine_products(product_id, created_at, routine_id);
+        CREATE TABLE IF NOT EXISTS routine_analysis (
+            routine_id TEXT NOT NULL REFERENCES routines(routine_id) ON DELETE CASCADE,
+            kind TEXT NOT NULL,
+            analysis TEXT NOT NULL,
+            PRIMARY KEY (routine_id, kind)
+        ) WITHOUT ROWID;
+    """
+    
+    # Statements are module constants so sqlite3's per-connection cache reuses them
+    SELECT_ROUTINE = "SELECT data FROM routines WHERE routine_id = ?"
+    SELECT_ANALYSIS = "SELECT kind, analysis FROM routine_analysis WHERE routine_id = ?"
+    INSERT_ROUTINE = (
+        "INSERT INTO routines (routine_id, user_id, time_of_day, created_at, updated_at, data) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    UPDATE_ROUTINE = (
+        "UPDATE routines SET user_id = ?, time_of_day = ?, updated_at = ?, data = ? WHERE routine_id = ?"
+    )
+    DELETE_ROUTINE = "DELETE FROM routines WHERE routine_id = ?"
+    INSERT_PRODUCT = "INSERT OR IGNORE INTO routine_products (routine_id, product_id, created_at) VALUES (?, ?, ?)"
+    DELETE_PRODUCTS = "DELETE FROM routine_products WHERE routine_id = ?"
+    UPSERT_ANALYSIS = (
+        "INSERT INTO routine_analysis (routine_id, kind, analysis) VALUES (?, ?, ?) "
+        "ON CONFLICT (routine_id, kind) DO UPDATE SET analysis = excluded.analysis"
+    )
+    DELETE_ANALYSIS = "DELETE FROM routine_analysis WHERE routine_id = ?"
+    
+    def __init__(self, db_path: str = "storage/routines.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+    
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+    
+    def close(self):
+        """Close this thread's connection; committed transactions are already durable"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def _insert_products(self, conn: sqlite3.Connection, routine: Dict):
+        conn.executemany(self.INSERT_PRODUCT, [
+            (routine['routine_id'], int(pid), routine['created_at']) for pid in routine.get('product_ids', [])
+        ])
+    
+    def create_routine(self, routine_data: Dict) -> str:
+        """Store routine data with generated ID"""
+        return self.create_routines([routine_data])[0]
+    
+    def create_routines(self, routines: List[Dict]) -> List[str]:
+        """Store many routines with generated IDs in one transaction"""
+        created = [_new_routine(routine_data) for routine_data in routines]
+        conn = self._connection()
+        with conn:
+            conn.executemany(self.INSERT_ROUTINE, [
+                (
+                    routine['routine_id'],
+                    routine.get('user_id'),
+                    routine.get('time_of_day'),
+                    routine['created_at'],
+                    routine['updated_at'],
+                    json.dumps(routine, default=str),
+                )
+                for routine in created
+            ])
+            for routine in created:
+                self._insert_products(conn, routine)
+        return [routine['routine_id'] for routine in created]
+    
+    def get_routine(self, routine_id: str) -> Optional[Dict]:
+        """Get routine data, with any stored analysis results"""
+        conn = self._connection()
+        row = conn.execute(self.SELECT_ROUTINE, (routine_id,)).fetchone()
+        if row is None:
+            return None
+        
+        routine = json.loads(row[0])
+        analysis = {kind: json.loads(value) for kind, value in conn.execute(self.SELECT_ANALYSIS, (routine_id,))}
+        if analysis:
+            routine['analysis'] = analysis
+        return routine
+    
+    def update_routine(self, routine_id: str, update_data: Dict) -> bool:
+        """Update routine with new data"""
+        return self.update_routines([(routine_id, update_data)])[0]
+    
+    def update_routines(self, updates: List[Tuple[str, Dict]]) -> List[bool]:
+        """Apply many updates in order in one transaction"""
+        results = []
+        conn = self._connection()
+        with conn:
+            for routine_id, update_data in updates:
+                row = conn.execute(self.SELECT_ROUTINE, (routine_id,)).fetchone()
+                results.append(row is not None)
+                if row is None:
+                    continue
+                
+                existing = json.loads(row[0])
+                products_changed = _changes_products(existing, update_data)
+                existing.update(update_data)
+                existing['updated_at'] = datetime.now().isoformat()
+                
+                conn.execute(self.UPDATE_ROUTINE, (
+                    existing.get('user_id'),
+                    existing.get('time_of_day'),
+                    existing['updated_at'],
+                    json.dumps(existing, default=str),
+                    routine_id,
+                ))
+                if products_changed:
+                    conn.execute(self.DELETE_ANALYSIS, (routine_id,))
+                    conn.execute(self.DELETE_PRODUCTS, (routine_id,))
+                    self._insert_products(conn, existing)
+        return results
+    
+    def delete_routine(self, routine_id: str) -> bool:
+        """Delete routine (products and analysis rows cascade)"""
+        conn = self._connection()
+        with conn:
+            return conn.execute(self.DELETE_ROUTINE, (routine_id,)).rowcount > 0
+    
+    def list_routines(self) -> List[Dict]:
+        """List all routines"""
+        rows = self._connection().execute("SELECT data FROM routines ORDER BY created_at, routine_id")
+        return [json.loads(data) for data, in rows]
+    
+    def save_analysis(self, routine_id: str, kind: str, analysis: Dict, expected: Optional[Dict] = None) -> bool:
+        """Store an analysis result for the routine without touching updated_at"""
+        return self.save_analyses(routine_id, {kind: analysis}, expected)
+    
+    def save_analyses(self, routine_id: str, analyses: Dict[str, Dict], expected: Optional[Dict] = None) -> bool:
+        """Store several analysis results for the routine in one transaction, unless it changed from expected"""
+        conn = self._connection()
+        with conn:
+            # Hold the write lock from the check to the upsert
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(self.SELECT_ROUTINE, (routine_id,)).fetchone()
+            if row is None or (expected is not None and _changes_products(json.loads(row[0]), expected)):
+                return False
+            conn.executemany(self.UPSERT_ANALYSIS, [
+                (routine_id, kind, json.dumps(analysis, default=str)) for kind, analysis in analyses.items()
+            ])
+        return True
+    
+    def iter_routines(
+        self,
+        user_id: Optional[str] = None,
+        time_of_day: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        product_id: Optional[int] = None,
+        batch_size: int = 500,
+    ) -> Iterator[Dict]:
+        """Stream routines in (created_at, routine_id) order using keyset pagination
+        
+        Each batch is fetched completely on the calling thread's connection, so the
+        generator may be resumed from a different thread (e.g. by a streaming response).
+        """
+        # Filtering by product reads routine_products in (product_id, created_at, routine_id) index order
+        if product_id is not None:
+            query = (
+                "SELECT p.created_at, p.routine_id, r.data FROM routine_products p "
+                "JOIN routines r ON r.routine_id = p.routine_id "
+                "WHERE p.product_id = ? AND (p.created_at, p.routine_id) > (?, ?)"
+            )
+            order = " ORDER BY p.created_at, p.routine_id LIMIT ?"
+            key_params = [int(product_id)]
+        else:
+            query = "SELECT created_at, routine_id, data FROM routines r WHERE (created_at, routine_id) > (?, ?)"
+            order = " ORDER BY created_at, routine_id LIMIT ?"
+            key_params = []
+        
+        clauses, params = [], []
+        if user_id is not None:
+            clauses.append("r.user_id = ?")
+            params.append(user_id)
+        if time_of_day is not None:
+            clauses.append("r.time_of_day = ?")
+            params.append(time_of_day)
+        query += "".join(f" AND {clause}" for clause in clauses) + order
+        
+        cursor = after or ("", "")
+        while True:
+            rows = self._connection().execute(query, (*key_params, *cursor, *params, batch_size)).fetchall()
+            for _, _, data in rows:
+                yield json.loads(data)
+            if len(rows) < batch_size:
+                return
+            cursor = (rows[-1][0], rows[-1][1])
+
+
+class _CreationOrder:
+    """Sorted (created_at, routine_id) keys of an in-memory store's routines
+    
+    Kept in step with every create and delete, so a listing seeks to its cursor
+    by bisection and reads one batch of keys at a time instead of copying and
+    scanning the whole store for each page.
+    """
+    
+    def __init__(self, routines: Dict[str, Dict]):
+        self._keys = sorted(_order_key(routine_id, routine) for routine_id, routine in routines.items())
+        self._lock = threading.Lock()
+    
+    def replace(self, routine_id: str, old: Optional[Dict], new: Optional[Dict]):
+        """Record that routine_id changed from old to new (None when absent)"""
+        old_key = _order_key(routine_id, old) if old is not None else None
+        new_key = _order_key(routine_id, new) if new is not None else None
+        if old_key == new_key:
+            return
+        with self._lock:
+            if old_key is not None:
+                pos = bisect.bisect_left(self._keys, old_key)
+                if pos < len(self._keys) and self._keys[pos] == old_key:
+                    del self._keys[pos]
+            if new_key is not None:
+                bisect.insort(self._keys, new_key)
+    
+    def after(self, cursor: Tuple[str, str], count: int) -> List[Tuple[str, str]]:
+        """Up to count keys following cursor, in order"""
+        with self._lock:
+            pos = bisect.bisect_right(self._keys, cursor)
+            return self._keys[pos:pos + count]
+
+
+def _order_key(routine_id: str, routine: Dict) -> Tuple[str, str]:
+    return (routine.get('created_at', ''), routine_id)
+
+
+def _iter_in_order(
+    routines: Dict[str, Dict],
+    order: _CreationOrder,
+    after: Optional[Tuple[str, str]],
+    user_id: Optional[str],
+    time_of_day: Optional[str],
+    product_id: Optional[int],
+    batch_size: int = 256,
+) -> Iterator[Dict]:
+    """Filtered routines in (created_at, routine_id) order after a cursor, a batch of keys at a time"""
+    cursor = after or ("", "")
+    while True:
+        keys = order.after(cursor, batch_size)
+        for key in keys:
+            routine = routines.get(key[1])
+            if routine is None or _order_key(key[1], routine) != key:
+                continue  # Deleted or re-keyed since the batch was read
+            if user_id is not None and routine.get('user_id') != user_id:
+                continue
+            if time_of_day is not None and routine.get('time_of_day') != time_of_day:
+                continue
+            if product_id is not None and product_id not in routine.get('product_ids', []):
+                continue
+            yield routine
+        if len(keys) < batch_size:
+            return
+        cursor = keys[-1]
+
+
+def _new_routine(routine_data: Dict) -> Dict:
+    """Copy of routine_data with a generated ID and creation timestamps"""
+    routine = routine_data.copy()
+    routine['routine_id'] = str(uuid.uuid4())
+    routine['created_at'] = datetime.now().isoformat()
+    routine['updated_at'] = datetime.now().isoformat()
+    return routine
+
+
+def _updated_routine(existing: Dict, update_data: Dict) -> Dict:
+    """New routine dict with update_data applied; stale analysis is dropped if the products change"""
+    updated = dict(existing)
+    if _changes_products(updated, update_data):
+        updated.pop('analysis', None)
+    updated.update(update_data)
+    updated['updated_at'] = datetime.now().isoformat()
+    return updated
+
+
+def _changes_products(existing: Dict, update_data: Dict) -> bool:
+    """Whether an update changes what stored analysis results were computed from"""
+    return any(
+        key in update_data and update_data[key] != existing.get(key)
+        for key in ('product_ids', 'items')
+    )
+
+def create_routine_storage(backend: str = "json") -> RoutineStorageInterface:
+    """Build the configured routine store ("json", "journal" or "sqlite")"""
+    if backend == "sqlite":
+        return SQLiteRoutineStore(settings.routine_db_path)
+    if backend == "journal":
+        return JournaledRoutineStore()
+    if backend == "json":
+        return JSONRoutineStore()
+    raise ValueError(f"Unknown routine storage backend: {backend}")
+
+class LazyRoutineStorage:
+    """The configured routine store, built on first use
+    
+    Store methods are looked up on the store itself. Importing the app must
+    not open the store: spawned analysis workers re-import the main module,
+    and only the serving process may load or append to the storage files.
+    """
+    
+    def __init__(self):
+        self._store: Optional[RoutineStorageInterface] = None
+        self._lock = threading.Lock()
+    
+    def __getattr__(self, name: str):
+        # Only called for attributes not defined on the wrapper itself
+        return getattr(self.get(), name)
+    
+    def get(self) -> RoutineStorageInterface:
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = create_routine_storage(settings.routine_storage)
+        return self._store
+    
+    def close(self):
+        """Close the store if it was ever opened"""
+        with self._lock:
+            store, self._store = self._store, None
+        if store is not None:
+            store.close()
 
-# Global storage instance
-routine_storage = JSONRoutineStore()
\ No newline at end of file
+# Global storage instance (settings.routine_storage selects the backend)
+routine_storage = LazyRoutineStorage()
@@ -0,0 +1,125 @@
+import csv
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from app.catalog import read_csv_tables
+from app.core.db import CatalogSnapshot, data_manager
+from app.services.storage_service import JournaledRoutineStore, JSONRoutineStore, SQLiteRoutineStore
+
+CATEGORIES = [
+    "Hydration & Barrier Support",
+    "Brightening & Tone Correction",
+    "Anti-Aging & Firmness",
+    "Acne & Sebum Control",
+    "Soothing & Redness Reduction",
+    "Exfoliation",
+]
+PRODUCT_TYPES = ["cleanser", "toner", "serum", "moisturizer", "sunscreen"]
+TEXTURES = ["water", "gel", "lotion", "cream"]
+INTERACTION_TYPES = ["clash", "synergy", "caution", "buffer"]
+
+# Far from the versions a DataManager hands out, so cached results never collide
+SYNTHETIC_VERSION = 1_000_000
+
+
+def _write(path: Path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def write_catalog(path: Path, seed: int = 0, ingredients: int = 300, products: int = 400, interactions: int = 2000):
+    """Write a random catalog with the same CSV layout as data/
+
+    Category scores are small integers, so ties between candidates are common.
+    """
+    rnd = random.Random(seed)
+    ingredient_ids = list(range(1, ingredients + 1))
+
+    _write(path / "ingredients.csv", [
+        "id", "inci_name", "function", "ph", "comedogenic_rating", "fungal_acne_safe",
+        "irritancy_rating", "description", "category_score",
+    ], [
+        (ing, f"Ingredient {ing}", "Fn", "", 0, True, 0, "d", json.dumps({
+            category: rnd.randint(0, 2) for category in rnd.sample(CATEGORIES, rnd.randint(0, 3))
+        }))
+        for ing in ingredient_ids
+    ])
+    _write(path / "common_names.csv", ["id", "inci_id", "name"], [
+        (idx, ing, f"Common {ing}") for idx, ing in enumerate(ingredient_ids[:20], start=1)
+    ])
+    _write(path / "scoring_labels.csv", ["id", "Name"], list(enumerate(CATEGORIES, start=1)))
+
+    product_rows, product_ingredient_rows = [], []
+    for product_id in range(1, products + 1):
+        product_rows.append((
+            product_id, f"P{product_id}", "B", "[]", "face", rnd.choice(PRODUCT_TYPES), rnd.choice(TEXTURES)
+        ))
+        contents = rnd.sample(ingredient_ids, rnd.randint(0, 20))
+        if contents and rnd.random() < 0.1:
+            contents.append(contents[0])  # Listed twice
+        if rnd.random() < 0.2:
+            contents.append(-product_id)  # Placeholder IDs are ignored
+        product_ingredient_rows.extend((product_id, "B", f"P{product_id}", ing) for ing in contents)
+    _write(path / "products.csv", [
+        "product_id", "product_name", "brand_name", "inci_ingredients", "target_area", "product_type", "product_texture",
+    ], product_rows)
+    _write(path / "product_ingredients.csv", ["product_id", "brand_name", "product_name", "ingredient_id"],
+           product_ingredient_rows)
+
+    pairs = set()
+    while len(pairs) < interactions:
+        pairs.add(tuple(sorted(rnd.sample(ingredient_ids, 2))))
+    pairs.add((ingredient_ids[0], ingredient_ids[0]))  # A self-interaction is never reported
+    _write(path / "interactions.csv", ["id", "a_id", "b_id", "interaction_type", "details", "effect"], [
+        (idx, a, b, rnd.choice(INTERACTION_TYPES), "x", "y") for idx, (a, b) in enumerate(sorted(pairs), start=1)
+    ])
+
+    _write(path / "treatments.csv", ["treatment_id", "treatment_name", "display_name"], [
+        (1, "microneedling", "Microneedling"),
+        (2, "chemical_peel", "Chemical Peel"),
+    ])
+    _write(path / "treatment_rules.csv", [
+        "treatment_id", "treatment_name", "ingredient_id", "ingredient_name", "advice", "duration_days", "reason",
+    ], [
+        (treatment_id, name, ing, f"Ingredient {ing}", "avoid", 7, "r")
+        for treatment_id, name in ((1, "microneedling"), (2, "chemical_peel"))
+        for ing in rnd.sample(ingredient_ids, 8)
+    ])
+
+
+@pytest.fixture(scope="session")
+def catalog_path(tmp_path_factory) -> Path:
+    path = tmp_path_factory.mktemp("catalog")
+    write_catalog(path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def synthetic_catalog(catalog_path) -> CatalogSnapshot:
+    return CatalogSnapshot(read_csv_tables(catalog_path), SYNTHETIC_VERSION)
+
+
+@pytest.fixture
+def catalog(synthetic_catalog, monkeypatch) -> CatalogSnapshot:
+    """The synthetic catalog, installed as the current one for the test"""
+    monkeypatch.setattr(data_manager, "snapshot", synthetic_catalog)
+    return synthetic_catalog
+
+
+@pytest.fixture(params=["json", "journal", "sqlite"])
+def store(request, tmp_path):
+    """An empty routine store of each backend"""
+    if request.param == "sqlite":
+        store = SQLiteRoutineStore(str(tmp_path / "routines.db"))
+    elif request.param == "journal":
+        store = JournaledRoutineStore(str(tmp_path))
+    else:
+        store = JSONRoutineStore(str(tmp_path / "routines.json"))
+    yield store
+    if hasattr(store, "close"):
+        store.close()
@@ -0,0 +1,33 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.db import data_manager
+from app.core.settings import settings
+from app.main import app
+
+
+@pytest.fixture
+def reloads(monkeypatch):
+    calls = []
+    monkeypatch.setattr(data_manager, "load_data", lambda: calls.append(1) or True)
+    return calls
+
+
+def test_reload_is_disabled_without_a_token(reloads, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", None)
+    response = TestClient(app).post("/api/admin/reload", headers={"Authorization": "Bearer "})
+    assert response.status_code == 403 and not reloads
+
+
+@pytest.mark.parametrize("authorization", [None, "Bearer wrong", "secret", "Basic secret"])
+def test_reload_rejects_bad_credentials(reloads, monkeypatch, authorization):
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    headers = {"Authorization": authorization} if authorization else {}
+    response = TestClient(app).post("/api/admin/reload", headers=headers)
+    assert response.status_code == 401 and not reloads
+
+
+def test_reload_with_token(reloads, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    response = TestClient(app).post("/api/admin/reload", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200 and reloads == [1]
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.services.analysis_pool import AnalysisPool, PoolBroken
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+def crash():
+    os._exit(1)
+
+
+def double(value):
+    return value * 2
+
+
+def test_pool_replaces_a_process_pool_whose_worker_died():
+    pool = AnalysisPool(threads=1, processes=1, process_threshold=1)
+
+    async def scenario():
+        with pytest.raises(PoolBroken):
+            await pool.run(1, crash)
+        return await pool.run(1, double, 21)
+
+    try:
+        assert asyncio.run(scenario()) == 42
+        assert pool.stats()["process"]["broken"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_importing_the_app_does_not_open_the_store(tmp_path):
+    db_path = tmp_path / "routines.db"
+    env = {**os.environ, "ROUTINE_STORAGE": "sqlite", "ROUTINE_DB_PATH": str(db_path)}
+    script = "\n".join([
+        "import app.main, os, sys",
+        "from app.services.storage_service import routine_storage",
+        "opened_on_import = os.path.exists(sys.argv[1])",
+        "routine_storage.list_routines()",
+        "print(opened_on_import, os.path.exists(sys.argv[1]))",
+    ])
+    result = subprocess.run(
+        [sys.executable, "-c", script, str(db_path)], cwd=PROJECT_ROOT, env=env, capture_output=True, text=True
+    )
+    assert result.stdout.split()[-2:] == ["False", "True"], result.stderr
+
+
+def test_task_submitted_as_the_pool_is_recycled_gets_a_fresh_pool():
+    pool = AnalysisPool(threads=1, processes=1, process_threshold=1)
+    # As if recycle_processes() shut the executor down after run() took it
+    pool.processes.executor = pool.processes.factory()
+    pool.processes.executor.shutdown(wait=False)
+    try:
+        assert asyncio.run(pool.run(1, double, 21)) == 42
+        assert pool.stats()["process"]["failed"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_start_spawns_every_process_worker():
+    pool = AnalysisPool(threads=1, processes=2, process_threshold=1)
+    try:
+        pool.start()
+        assert len(pool.processes.executor._processes) == 2
+        executor = pool.processes.executor
+        pool.recycle_processes()
+        assert pool.processes.executor is not executor and len(pool.processes.executor._processes) == 2
+    finally:
+        pool.shutdown()
@@ -0,0 +1,61 @@
+import random
+
+from fastapi.testclient import TestClient
+
+from app.catalog import read_csv_tables
+from app.core.db import CatalogSnapshot, data_manager
+from app.main import app
+from app.routers import routines as routines_router
+from app.services.routine_service import RoutineService
+from app.services.skincare_analyzer import analyzer
+from app.services.storage_service import JSONRoutineStore
+from tests.conftest import SYNTHETIC_VERSION
+
+
+def test_save_analyses_is_compare_and_set(store):
+    routine_id = store.create_routine({"name": "r", "product_ids": [1, 2], "items": []})
+    read = store.get_routine(routine_id)
+    store.update_routine(routine_id, {"product_ids": [1, 3]})
+
+    # Computed from the routine as read, before the update: never attached
+    assert not store.save_analyses(routine_id, {"score": {"body": "old"}}, read)
+    assert "analysis" not in store.get_routine(routine_id)
+
+    current = store.get_routine(routine_id)
+    assert store.save_analyses(routine_id, {"score": {"body": "new"}}, current)
+    assert store.get_routine(routine_id)["analysis"] == {"score": {"body": "new"}}
+    assert not store.save_analyses("missing", {"score": {"body": "new"}})
+
+
+def _routine_with_interactions(catalog):
+    rnd = random.Random(5)
+    service = RoutineService()
+    while True:
+        product_ids = rnd.sample(list(catalog.product_index), 6)
+        items = service.order_routine_products(product_ids)
+        if analyzer.analyze_interactions(items):
+            return product_ids, items
+
+
+def test_stored_analysis_is_recomputed_after_catalog_change(catalog, catalog_path, tmp_path, monkeypatch):
+    store = JSONRoutineStore(str(tmp_path / "routines.json"))
+    monkeypatch.setattr(routines_router, "routine_storage", store)
+    client = TestClient(app)
+
+    product_ids, items = _routine_with_interactions(catalog)
+    routine_id = store.create_routine({"name": "r", "product_ids": product_ids, "items": [i.dict() for i in items]})
+    url = f"/api/routines/{routine_id}/analyze/interactions"
+    first = client.get(url)
+    assert first.status_code == 200 and first.json()
+    assert store.get_routine(routine_id)["analysis"]["interactions"]["catalog"] == catalog.fingerprint
+
+    # The same catalog without any interactions, as after emptying interactions.csv and reloading
+    tables = read_csv_tables(catalog_path)
+    tables["interactions"] = tables["interactions"].__class__({name: [] for name in tables["interactions"].columns})
+    changed = CatalogSnapshot(tables, SYNTHETIC_VERSION + 1, fingerprint="changed")
+    monkeypatch.setattr(data_manager, "snapshot", changed)
+
+    assert client.get(url).json() == []
+    assert client.get(f"/api/routines/{routine_id}/analysis?include=interactions").json() == {"interactions": []}
+    assert store.get_routine(routine_id)["analysis"]["interactions"]["catalog"] == "changed"
+    store.close()
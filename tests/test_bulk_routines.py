@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.storage_service import JSONRoutineStore
+
+
+def test_repeated_routine_id_builds_on_earlier_items(catalog, tmp_path, monkeypatch):
+    store = JSONRoutineStore(str(tmp_path / "routines.json"))
+    monkeypatch.setattr("app.routers.routines.routine_storage", store)
+    client = TestClient(app)
+
+    created = client.post("/api/routines:bulk", json={"routines": [{"name": "r", "product_ids": [2, 1]}]}).json()
+    routine_id = created["results"][0]["routine_id"]
+    response = client.put("/api/routines:bulk", json={"routines": [
+        {"routine_id": routine_id, "product_ids": [3, 4]},
+        {"routine_id": routine_id, "time_of_day": "am"},
+    ]})
+    assert [result["status"] for result in response.json()["results"]] == [200, 200]
+
+    stored = store.get_routine(routine_id)
+    store.close()
+    assert stored["product_ids"] == [3, 4] and stored["time_of_day"] == "am"
+    assert sorted(item["product_id"] for item in stored["items"]) == [3, 4]
@@ -0,0 +1,28 @@
+import asyncio
+import threading
+
+from app.core import catalog_responses as module
+from app.core.catalog_responses import CatalogResponseCache
+
+
+def test_renders_off_the_event_loop(catalog, monkeypatch):
+    threads = []
+
+    class RecordingResponses(module.CatalogResponses):
+        def __init__(self, snapshot):
+            threads.append(threading.current_thread())
+            super().__init__(snapshot)
+
+    monkeypatch.setattr(module, "CatalogResponses", RecordingResponses)
+    cache = CatalogResponseCache()
+    responses = asyncio.run(cache.get_async())
+    assert responses.version == catalog.version
+    assert threads and threads[0] is not threading.main_thread()
+    # Served from the cache afterwards
+    assert asyncio.run(cache.get_async()) is responses and len(threads) == 1
+
+
+def test_reload_renders_the_new_catalog(catalog, monkeypatch):
+    cache = CatalogResponseCache()
+    cache.refresh()  # As the reload listener does
+    assert cache._current.version == catalog.version
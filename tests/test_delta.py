@@ -0,0 +1,90 @@
+import json
+import random
+from collections import Counter
+
+import pytest
+
+from app.catalog import read_csv_tables
+from app.core.db import CatalogSnapshot
+from app.services.routine_service import RoutineService
+from app.services.skincare_analyzer import analyzer
+from tests.conftest import SYNTHETIC_VERSION, write_catalog
+
+
+def full_analysis(items, catalog):
+    """Interactions and score from analyzing the whole routine again"""
+    resolved = analyzer.resolve_routine_ingredients(items, catalog)
+    return analyzer._analyze_interactions(resolved, catalog), analyzer._calculate_routine_score(resolved, catalog)
+
+
+def counts(interactions):
+    return Counter(json.dumps(interaction.model_dump(), sort_keys=True) for interaction in interactions)
+
+
+def assert_score_matches(delta, before, after):
+    assert list(delta.score.category_scores) == list(after.category_scores)
+    assert delta.score.category_scores == pytest.approx(after.category_scores, abs=1e-9)
+    assert delta.total_score_delta == pytest.approx(after.total_score - before.total_score, abs=1e-9)
+
+
+def test_adding_a_product_matches_full_reanalysis(catalog):
+    rnd = random.Random(3)
+    service = RoutineService()
+    product_ids = list(catalog.product_index)
+    for _ in range(100):
+        base = rnd.sample(product_ids, rnd.randint(0, 15))
+        added = rnd.choice([pid for pid in product_ids if pid not in base])
+        items = service.order_routine_products(base)
+        delta = analyzer.analyze_delta(items, added=service.order_routine_products([added])[0])
+
+        before, before_score = full_analysis(items, catalog)
+        after, after_score = full_analysis(service.order_routine_products(base + [added]), catalog)
+        assert counts(after) == counts(before) + counts(delta.added_interactions)
+        # Reported in the order the full analysis of the new routine lists them
+        new = counts(delta.added_interactions)
+        assert [i for i in after if json.dumps(i.model_dump(), sort_keys=True) in new] == delta.added_interactions
+        assert_score_matches(delta, before_score, after_score)
+
+
+def test_removing_a_product_matches_full_reanalysis(catalog):
+    rnd = random.Random(4)
+    service = RoutineService()
+    product_ids = list(catalog.product_index)
+    for _ in range(100):
+        base = rnd.sample(product_ids, rnd.randint(1, 15))
+        removed = rnd.choice(base)
+        items = service.order_routine_products(base)
+        delta = analyzer.analyze_delta(items, removed_product_id=removed)
+
+        before, before_score = full_analysis(items, catalog)
+        after, after_score = full_analysis(
+            service.order_routine_products([pid for pid in base if pid != removed]), catalog
+        )
+        assert counts(before) == counts(after) + counts(delta.removed_interactions)
+        assert_score_matches(delta, before_score, after_score)
+
+
+class ReloadingDuringRequest:
+    """A data manager whose catalog is replaced right after the first read"""
+
+    def __init__(self, first, then):
+        self.reads = iter([first])
+        self.then = then
+
+    @property
+    def snapshot(self):
+        return next(self.reads, self.then)
+
+
+def test_delta_uses_one_catalog_snapshot(catalog, tmp_path, monkeypatch):
+    write_catalog(tmp_path, seed=1)
+    reloaded = CatalogSnapshot(read_csv_tables(tmp_path), SYNTHETIC_VERSION + 2)
+    monkeypatch.setattr(analyzer, "dm", ReloadingDuringRequest(catalog, reloaded))
+    service = RoutineService()
+    base = list(catalog.product_index)[:6]
+    items = service.order_routine_products(base)
+    delta = analyzer.analyze_delta(items, removed_product_id=base[0])
+
+    _, before_score = full_analysis(items, catalog)
+    _, after_score = full_analysis(service.order_routine_products(base[1:]), catalog)
+    assert_score_matches(delta, before_score, after_score)
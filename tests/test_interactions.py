@@ -0,0 +1,49 @@
+import random
+
+from app.models.routine import InteractionResult
+from app.services.routine_service import RoutineService
+from app.services.skincare_analyzer import analyzer
+
+
+def pairwise_interactions(resolved, catalog):
+    """The pairwise scan the interaction index replaced"""
+    interactions = []
+    for i, (ing_a, source_a) in enumerate(resolved):
+        for ing_b, source_b in resolved[i + 1:]:
+            if ing_a != ing_b:
+                interaction_data = catalog.get_interaction(ing_a, ing_b)
+                if interaction_data:
+                    interactions.append(InteractionResult(
+                        ingredient_a=ing_a,
+                        ingredient_b=ing_b,
+                        ingredient_a_name=catalog.ingredient_lookup.get(ing_a, "Unknown"),
+                        ingredient_b_name=catalog.ingredient_lookup.get(ing_b, "Unknown"),
+                        product_a=source_a,
+                        product_b=source_b,
+                        **interaction_data
+                    ))
+    return interactions
+
+
+def test_find_pairs_matches_pairwise_scan(catalog):
+    rnd = random.Random(1)
+    ingredient_ids = list(catalog.ingredient_index) + [-1, 10 ** 6]
+    for _ in range(300):
+        ids = [rnd.choice(ingredient_ids) for _ in range(rnd.randint(0, 60))]
+        expected = [
+            (i, j, catalog.get_interaction(ids[i], ids[j]))
+            for i in range(len(ids))
+            for j in range(i + 1, len(ids))
+            if ids[i] != ids[j] and catalog.get_interaction(ids[i], ids[j])
+        ]
+        assert catalog.interaction_index.find_pairs(ids) == expected
+
+
+def test_routine_interactions_match_pairwise_scan(catalog):
+    rnd = random.Random(2)
+    service = RoutineService()
+    product_ids = list(catalog.product_index)
+    for _ in range(200):
+        items = service.order_routine_products(rnd.sample(product_ids, rnd.randint(0, 12)))
+        resolved = analyzer.resolve_routine_ingredients(items, catalog)
+        assert analyzer._analyze_interactions(resolved, catalog) == pairwise_interactions(resolved, catalog)
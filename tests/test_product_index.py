@@ -0,0 +1,75 @@
+import random
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.db import CatalogSnapshot, data_manager
+from app.core.ingredient_product_index import IngredientProductIndex
+from app.main import app
+from tests.conftest import SYNTHETIC_VERSION
+
+
+def scan(catalog, contains, excludes):
+    """The per-product scan the ingredient -> products index replaced"""
+    return sorted(
+        pid for pid in catalog.product_index
+        if set(contains) <= set(catalog.product_ingredient_index.get(pid, ()))
+        and not set(excludes) & set(catalog.product_ingredient_index.get(pid, ()))
+    )
+
+
+@pytest.fixture(params=["built", "compiled"])
+def indexed_catalog(request, synthetic_catalog, monkeypatch):
+    """The synthetic catalog with its index built from CSV tables or mapped from compiled arrays"""
+    catalog = synthetic_catalog
+    if request.param == "compiled":
+        tables = {
+            name: getattr(synthetic_catalog, name) for name in (
+                "ingredients", "products", "product_ingredients", "interactions",
+                "treatments", "treatment_rules", "scoring_labels", "common_names",
+            )
+        }
+        catalog = CatalogSnapshot(
+            tables, SYNTHETIC_VERSION + 1, source="snapshot", arrays=synthetic_catalog.compile_arrays()
+        )
+        assert catalog._compiled_arrays("ingredient_products", ("ingredient_ids", "indptr", "product_ids"))
+    monkeypatch.setattr(data_manager, "snapshot", catalog)
+    return catalog
+
+
+def test_index_queries_match_scan(indexed_catalog):
+    rnd = random.Random(6)
+    ingredient_ids = list(indexed_catalog.ingredient_index) + [-1, 10 ** 6]
+    for _ in range(300):
+        contains = rnd.sample(ingredient_ids, rnd.randint(0, 2))
+        excludes = rnd.sample(ingredient_ids, rnd.randint(0, 3))
+        assert indexed_catalog.find_product_ids(contains, excludes) == scan(indexed_catalog, contains, excludes)
+
+
+def test_products_endpoint_filters_by_names_and_ids(indexed_catalog):
+    client = TestClient(app)
+    params = {"contains": "ingredient 7, 12", "excludes": "Common 3"}
+    response = client.get("/api/products", params=params)
+    assert response.status_code == 200
+    assert [product["product_id"] for product in response.json()] == scan(indexed_catalog, [7, 12], [3])
+
+    response = client.get("/api/products", params={"contains": "nosuchthing,999999"})
+    assert response.status_code == 400 and "nosuchthing" in response.json()["detail"]
+
+
+def test_resolve_ingredient(catalog):
+    assert catalog.resolve_ingredient("12") == 12
+    assert catalog.resolve_ingredient(" Ingredient 12 ") == 12
+    assert catalog.resolve_ingredient("common 3") == 3
+    assert catalog.resolve_ingredient("999999") is None
+    assert catalog.resolve_ingredient("nosuchthing") is None
+
+
+def test_index_lists_only_catalog_products():
+    index = IngredientProductIndex.build({1: (10, 11), 2: (10,), 99: (10, 11)}, product_ids=[1, 2])
+    universe = np.array([1, 2, 3], dtype=np.int64)
+    assert index.products_with(10).tolist() == [1, 2]
+    assert index.query(universe, contains=[10, 11]).tolist() == [1]
+    assert index.query(universe, excludes=[11]).tolist() == [2, 3]
+    assert index.query(universe, contains=[10], excludes=[12]).tolist() == [1, 2]
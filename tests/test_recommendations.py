@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from app.services.routine_service import RoutineService
+from app.services.skincare_analyzer import analyzer
+
+
+def total_score(product_ids, catalog, service):
+    items = service.order_routine_products(product_ids)
+    score = analyzer._calculate_routine_score(analyzer.resolve_routine_ingredients(items, catalog), catalog)
+    return sum(score.category_scores.values())
+
+
+def new_clashes(base, product_id, catalog):
+    """Clashing ingredient pairs the product adds, counted pair by pair"""
+    known = lambda ingredient_ids: {ing for ing in ingredient_ids if ing in catalog.ingredient_lookup}
+    present = known(ing for pid in base for ing in catalog.get_product_ingredient_ids(pid))
+    added = sorted(known(catalog.get_product_ingredient_ids(product_id)) - present)
+    count = 0
+    for idx, ing in enumerate(added):
+        for other in list(present) + added[:idx]:
+            interaction = catalog.get_interaction(ing, other)
+            count += bool(interaction) and interaction["interaction_type"].lower() == "clash"
+    return count
+
+
+@pytest.mark.parametrize("clash_penalty", [1.0, 0.5])
+def test_recommendations_match_brute_force(catalog, clash_penalty):
+    rnd = random.Random(5)
+    service = RoutineService()
+    product_ids = list(catalog.product_index)
+    product_types = [None] + list(catalog.products_by_type)
+    for _ in range(25):
+        base = rnd.sample(product_ids, rnd.randint(0, 8))
+        product_type = rnd.choice(product_types)
+        k = rnd.randint(1, 12)
+        result = analyzer.recommend_products(service.order_routine_products(base), product_type, k, clash_penalty)
+
+        pool = catalog.products_by_type[product_type] if product_type else product_ids
+        base_total = total_score(base, catalog, service)
+        expected = {}
+        for pid in pool:
+            # Products listed without ingredients are never candidates
+            if pid not in base and pid in catalog.score_matrix.product_positions:
+                gain = total_score(base + [pid], catalog, service) - base_total
+                expected[pid] = (gain, new_clashes(base, pid, catalog))
+        ranked = sorted(expected, key=lambda pid: (-(expected[pid][0] - clash_penalty * expected[pid][1]), pid))
+
+        assert result.candidates == len(expected)
+        # Exact order: ties, including at the k-th place, go to the lower product ID
+        assert [rec.product_id for rec in result.recommendations] == ranked[:k]
+        for rec in result.recommendations:
+            gain, clashes = expected[rec.product_id]
+            assert rec.score_gain == pytest.approx(gain, abs=1e-6)
+            assert rec.new_clashes == clashes
+            assert sum(rec.category_deltas.values()) == pytest.approx(gain, abs=1e-6)
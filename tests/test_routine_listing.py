@@ -0,0 +1,108 @@
+import random
+from datetime import datetime
+from itertools import islice
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.storage_service import JSONRoutineStore
+
+
+def listing(routines, user_id=None, time_of_day=None, product_id=None):
+    """The filtered, ordered listing computed from every stored routine"""
+    return sorted(
+        (
+            routine for routine in routines
+            if (user_id is None or routine.get("user_id") == user_id)
+            and (time_of_day is None or routine.get("time_of_day") == time_of_day)
+            and (product_id is None or product_id in routine.get("product_ids", []))
+        ),
+        key=lambda routine: (routine["created_at"], routine["routine_id"]),
+    )
+
+
+def populate(store, count=300, seed=0):
+    rnd = random.Random(seed)
+    store.create_routines([
+        {
+            "user_id": f"u{rnd.randint(0, 4)}",
+            "time_of_day": rnd.choice(["AM", "PM"]),
+            "product_ids": rnd.sample(range(1, 20), rnd.randint(0, 4)),
+        }
+        for _ in range(count)
+    ])
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"user_id": "u1"},
+    {"product_id": 7},
+    {"product_id": 7, "user_id": "u2"},
+    {"product_id": 3, "time_of_day": "PM"},
+    {"product_id": 99},
+])
+def test_filtered_listing_pages_in_order(store, filters):
+    populate(store)
+    expected = listing(store.list_routines(), **filters)
+
+    assert [r["routine_id"] for r in store.iter_routines(**filters)] == [r["routine_id"] for r in expected]
+    if expected:
+        middle = expected[len(expected) // 2]
+        after = (middle["created_at"], middle["routine_id"])
+        rest = [r["routine_id"] for r in store.iter_routines(after=after, **filters)]
+        assert rest == [r["routine_id"] for r in expected[len(expected) // 2 + 1:]]
+
+
+def test_list_routines_by_product_endpoint(tmp_path, monkeypatch):
+    store = JSONRoutineStore(str(tmp_path / "routines.json"))
+    monkeypatch.setattr("app.routers.routines.routine_storage", store)
+    populate(store)
+    expected = [r["routine_id"] for r in listing(store.list_routines(), product_id=5)]
+
+    client = TestClient(app)
+    seen, cursor = [], None
+    while True:
+        params = {"product_id": 5, "limit": 7, **({"after": cursor} if cursor else {})}
+        page = client.get("/api/routines", params=params).json()
+        seen += [routine["routine_id"] for routine in page["routines"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    store.close()
+    assert seen == expected
+
+
+class FrozenClock:
+    """Stands in for datetime so every routine gets the same created_at"""
+
+    @staticmethod
+    def now():
+        return datetime(2024, 1, 1)
+
+
+def test_pages_cover_routines_created_at_the_same_instant(store, monkeypatch):
+    monkeypatch.setattr("app.services.storage_service.datetime", FrozenClock)
+    store.create_routines([{"user_id": "u"} for _ in range(50)])
+    for _ in range(50):
+        store.create_routine({"user_id": "u"})
+    expected = [r["routine_id"] for r in listing(store.list_routines())]
+
+    seen, after = [], None
+    while True:
+        page = list(islice(store.iter_routines(after=after), 7))
+        seen += [routine["routine_id"] for routine in page]
+        if len(page) < 7:
+            break
+        after = (page[-1]["created_at"], page[-1]["routine_id"])
+    assert seen == expected
+
+
+def test_listing_follows_deletes(store):
+    populate(store, count=100)
+    routines = listing(store.list_routines())
+    for routine in routines[::3]:
+        store.delete_routine(routine["routine_id"])
+    assert [r["routine_id"] for r in store.iter_routines()] == [
+        r["routine_id"] for idx, r in enumerate(routines) if idx % 3
+    ]
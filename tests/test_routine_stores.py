@@ -0,0 +1,90 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.storage_service import JournaledRoutineStore, JSONRoutineStore
+
+
+def test_concurrent_analysis_saves_never_revert_updates(store):
+    routine_ids = store.create_routines([{"name": f"r{idx}", "product_ids": [1]} for idx in range(200)])
+    done = threading.Event()
+
+    def rename():
+        for routine_id in routine_ids:
+            store.update_routine(routine_id, {"name": "renamed"})
+        done.set()
+
+    def save_analyses():
+        while not done.is_set():
+            for routine_id in routine_ids:
+                store.save_analysis(routine_id, "score", {"body": {}})
+
+    threads = [threading.Thread(target=rename), threading.Thread(target=save_analyses)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(store.get_routine(routine_id)["name"] == "renamed" for routine_id in routine_ids)
+
+
+def test_journal_compacts_in_background_and_replays(tmp_path):
+    store = JournaledRoutineStore(str(tmp_path), compact_every=10)
+    routine_ids = store.create_routines([{"name": f"r{idx}"} for idx in range(5)])
+    for step in range(40):
+        store.update_routine(routine_ids[step % 5], {"name": f"step {step}"})
+    store.delete_routine(routine_ids[0])
+    state = dict(store.routines)
+    store.close()
+
+    assert store.snapshot_path.exists() and not store.segment_path.exists()
+    reopened = JournaledRoutineStore(str(tmp_path), compact_every=10)
+    assert reopened.routines == state
+    reopened.close()
+
+
+def test_interrupted_compaction_is_finished_on_startup(tmp_path):
+    store = JournaledRoutineStore(str(tmp_path))
+    store.create_routines([{"name": f"r{idx}"} for idx in range(3)])
+    state = dict(store.routines)
+    store.close()
+    # As if the process died right after rotating the journal
+    store.journal_path.rename(store.segment_path)
+
+    reopened = JournaledRoutineStore(str(tmp_path))
+    assert reopened.routines == state
+    assert not reopened.segment_path.exists() and reopened.snapshot_path.exists()
+    reopened.close()
+
+
+def test_lone_write_is_synced_without_another_write(tmp_path):
+    store = JournaledRoutineStore(str(tmp_path), fsync_every=64, fsync_interval=0.05)
+    store.create_routine({"name": "r"})
+    deadline = time.monotonic() + 2
+    while store._unsynced and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store._unsynced == 0
+    store.close()
+
+
+def test_failed_json_flush_is_reported_to_the_writer(tmp_path, monkeypatch, catalog):
+    store = JSONRoutineStore(str(tmp_path / "routines.json"))
+    save = store._save_routines
+    failures = iter([OSError("disk full")])
+
+    def failing_save(routines):
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        save(routines)
+
+    monkeypatch.setattr(store, "_save_routines", failing_save)
+    monkeypatch.setattr("app.routers.routines.routine_storage", store)
+    response = TestClient(app).post("/api/routines", json={"name": "r", "product_ids": [1]})
+    assert response.status_code == 500
+
+    # The next write flushes everything in memory again
+    routine_id = store.create_routine({"name": "later"})
+    store.close()
+    assert routine_id in JSONRoutineStore(str(tmp_path / "routines.json")).routines
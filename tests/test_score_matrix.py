@@ -0,0 +1,43 @@
+import random
+
+import numpy as np
+import pytest
+
+
+def test_score_batch_matches_single_scores(catalog):
+    rnd = random.Random(4)
+    matrix = catalog.score_matrix
+    product_ids = list(catalog.product_index)
+    routines = [rnd.sample(product_ids, rnd.randint(0, 15)) for _ in range(300)]
+    routines += [[], [product_ids[0], product_ids[0]], [-1]]
+
+    expected = [
+        matrix.score(ing for pid in routine for ing in catalog.get_product_ingredient_ids(pid))
+        for routine in routines
+    ]
+    for got, want in zip(matrix.score_batch(routines), expected):
+        assert list(got) == list(want)
+        assert got == pytest.approx(want)
+
+
+def test_score_batch_of_nothing(catalog):
+    assert catalog.score_matrix.score_batch([]) == []
+
+
+def test_candidate_gains_match_score_delta(catalog):
+    rnd = random.Random(5)
+    matrix = catalog.score_matrix
+    product_ids = list(catalog.product_index)
+    for _ in range(20):
+        base = matrix.rows(
+            ing for pid in rnd.sample(product_ids, rnd.randint(0, 8)) for ing in catalog.get_product_ingredient_ids(pid)
+        )
+        candidates = rnd.sample(range(len(matrix.product_ids)), 40)
+        gains, clashes = matrix.candidate_gains(base, np.array(candidates, dtype=np.intp))
+
+        for position, gain, clash_count in zip(candidates, gains, clashes):
+            product_rows = matrix.product_rows[matrix.product_indptr[position]:matrix.product_indptr[position + 1]]
+            added = np.setdiff1d(product_rows, base).astype(np.intp)
+            assert gain == pytest.approx(matrix.score_delta(base, added).sum())
+            within = np.triu(matrix.clash[np.ix_(added, added)], k=1).sum()
+            assert clash_count == matrix.clash[np.ix_(added, base)].sum() + within
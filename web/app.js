@@ -108,14 +108,20 @@ async function loadProducts() {
 
 async function loadSavedRoutines() {
     try {
-        const response = await fetch(`${API_BASE}/routines`);
-        if (response.ok) {
+        // Follow pagination cursors until every routine is loaded
+        savedRoutines = [];
+        let cursor = null;
+        do {
+            const query = cursor ? `?limit=500&after=${encodeURIComponent(cursor)}` : '?limit=500';
+            const response = await fetch(`${API_BASE}/routines${query}`);
+            if (!response.ok) {
+                console.error('Failed to load saved routines');
+                break;
+            }
             const data = await response.json();
-            savedRoutines = data.routines || [];
-        } else {
-            console.error('Failed to load saved routines');
-            savedRoutines = [];
-        }
+            savedRoutines.push(...(data.routines || []));
+            cursor = data.next_cursor;
+        } while (cursor);
     } catch (error) {
         console.error('Error loading saved routines:', error);
         savedRoutines = [];